@@ -1,15 +1,227 @@
-import matplotlib.pyplot as plt
-from modules import CourseTime, Course, Teacher, Class
-
-
-# def plot_class(target_class: Class, data: list[tuple[CourseTime, Course]]):
-#     """
-#     Draw a picture of the class follow the data.
-#     """
-#     result_day = []
-#     # Process data.
-#     for piece in data:
-#         course_time, course = piece
-#         day = course_time.day
-#         if day not in result_day:
-#             result_day.append(day)
\ No newline at end of file
+"""
+Vectorized quality metrics of finished timetables.
+
+A timetable (see `main.timetable_of()`) is turned into a dense course id array of
+class x day x period (-1 for an empty course time), a batch of them is stacked into
+candidate x class x day x period, and every metric is computed with numpy over the
+whole batch, so hundreds of candidates of a multi-run are scored at once.
+
+Usage:
+    python analyze.py CourseScheduleOutput.csv --settings settings.yaml
+"""
+import argparse
+import json
+
+import numpy as np
+
+import export
+import main
+import modules
+from probability import PROBABILITY_MODES
+
+
+class TimetableAnalyzer(object):
+    """
+    The course, teacher and class indexes of a loaded model, and the metrics over them.
+    """
+
+    def __init__(
+        self,
+        all_courses: dict[str, modules.Course],
+        all_classes: dict[str, modules.Class],
+        courses_list: list[modules.Course],
+        main_modes: tuple[int, ...] = (0,),
+        morning_periods: int = 5,
+        evening_periods: int = 4,
+    ):
+        """
+        :param courses_list: The courses repeated by their hours, see `main.build_courses_list()`
+        :param main_modes: The modes of the main subjects, default to 必修
+        :param morning_periods: The first periods of a day which are morning
+        :param evening_periods: The last periods of a day which are evening (晚一 ~ 晚四)
+        """
+        self.days = len(modules.WEEKDAYS)
+        self.depth = modules.COURSE_DEPTH
+        self.course_names = sorted(all_courses)
+        self.course_index = {name: index for index, name in enumerate(self.course_names)}
+        self.class_nums = list(all_classes)
+        self.class_index = {class_num: index for index, class_num in enumerate(self.class_nums)}
+
+        courses = [all_courses[name] for name in self.course_names]
+        modes = np.array([course.mode for course in courses])
+        # A course is over the daily max if it has more than max+1 on a day, as the schedule allows.
+        self.daily_limit = np.array([course.daily_max_courses + 1 for course in courses])
+        self.main_course = np.isin(modes, main_modes)
+        self.counted_course = np.isin(modes, PROBABILITY_MODES)
+
+        self.hours = np.zeros(len(courses), dtype=np.int64)
+        for course in courses_list:
+            self.hours[self.course_index[course.name]] += 1
+
+        # class x course -> teacher id, -1 if the class has no teacher of it.
+        teacher_names = sorted({
+            teacher.name for class_obj in all_classes.values()
+            for teacher in class_obj.teachers.values() if teacher is not None
+        })
+        self.teacher_names = teacher_names
+        teacher_index = {name: index for index, name in enumerate(teacher_names)}
+        self.class_teacher = np.full((len(self.class_nums), len(courses)), -1, dtype=np.int64)
+        for class_num, class_obj in all_classes.items():
+            for course_name, teacher in class_obj.teachers.items():
+                if teacher is not None and course_name in self.course_index:
+                    self.class_teacher[self.class_index[class_num], self.course_index[course_name]] = \
+                        teacher_index[teacher.name]
+
+        self.morning = np.arange(self.depth) < morning_periods
+        self.evening = np.arange(self.depth) >= self.depth - evening_periods
+
+    def to_array(self, timetable: dict[str, list[tuple[int, int, str]]]) -> np.ndarray:
+        """
+        :return: The course ids of class x day x period, -1 for an empty course time
+        :raise ValueError: If the timetable has an unknown class or course
+        """
+        grid = np.full((len(self.class_nums), self.days * self.depth), -1, dtype=np.int64)
+        for class_num, decided_courses in timetable.items():
+            class_id = self.class_index.get(str(class_num))
+            if class_id is None:
+                raise ValueError(f"Class '{class_num}' not found in ALL_CLASSES!")
+            if not decided_courses:
+                continue
+            days, course_times, names = zip(*decided_courses)
+            try:
+                course_ids = [self.course_index[name] for name in names]
+            except KeyError as e:
+                raise ValueError(f"Course {e} not found in ALL_COURSES!") from None
+            slots = (np.asarray(days) - 1) * self.depth + np.asarray(course_times) - 1
+            grid[class_id, slots] = course_ids
+        return grid.reshape(len(self.class_nums), self.days, self.depth)
+
+    def stack(self, timetables: list[dict[str, list[tuple[int, int, str]]]]) -> np.ndarray:
+        """
+        :return: The course ids of candidate x class x day x period
+        """
+        return np.stack([self.to_array(timetable) for timetable in timetables])
+
+    def teacher_busy(self, grid: np.ndarray) -> np.ndarray:
+        """
+        :param grid: candidate x class x day x period course ids
+        :return: Whether each teacher has a course, candidate x teacher x day x period
+        """
+        busy = np.zeros((grid.shape[0], len(self.teacher_names), self.days, self.depth), dtype=bool)
+        candidate, class_id, day, period = np.nonzero(grid >= 0)
+        teacher = self.class_teacher[class_id, grid[candidate, class_id, day, period]]
+        has_teacher = teacher >= 0
+        busy[
+            candidate[has_teacher], teacher[has_teacher], day[has_teacher], period[has_teacher]
+        ] = True
+        return busy
+
+    def daily_counts(self, grid: np.ndarray) -> np.ndarray:
+        """
+        :param grid: candidate x class x day x period course ids
+        :return: The number of each course, candidate x class x day x course
+        """
+        courses = len(self.course_names)
+        cells = grid.reshape(-1, self.depth)
+        rows = np.broadcast_to(np.arange(cells.shape[0])[:, None], cells.shape)
+        filled = cells >= 0
+        counts = np.bincount(
+            rows[filled] * courses + cells[filled], minlength=cells.shape[0] * courses
+        )
+        return counts.reshape(grid.shape[:3] + (courses,))
+
+    def metrics(self, grid: np.ndarray) -> dict[str, np.ndarray]:
+        """
+        The metrics of each candidate.
+        :param grid: candidate x class x day x period course ids, see `stack()`
+        :return: {name: array of one value per candidate}
+            filled: decided course times
+            subjects_per_day: mean number of different courses of a class on a day with courses
+            daily_max_violations: (class, day, course) over the daily max courses
+            main_morning / main_evening: share of the main subject courses in the morning / evening
+            teacher_gaps: free periods between the first and the last course of a teacher's day
+            teacher_consecutive: pairs of adjacent periods which a teacher both teaches
+            teacher_max_run: the longest run of periods a teacher teaches without a break
+            hours_short / hours_over: normal course times under / over the course hours
+        """
+        filled = grid >= 0
+        counts = self.daily_counts(grid)
+
+        present = counts > 0
+        day_used = present.any(axis=-1)
+        subjects_per_day = present.sum(axis=-1).sum(axis=(1, 2)) / np.maximum(day_used.sum(axis=(1, 2)), 1)
+        daily_max_violations = (counts > self.daily_limit).sum(axis=(1, 2, 3))
+
+        main_lessons = filled & self.main_course[np.where(filled, grid, 0)]
+        main_total = np.maximum(main_lessons.sum(axis=(1, 2, 3)), 1)
+        main_morning = (main_lessons & self.morning).sum(axis=(1, 2, 3)) / main_total
+        main_evening = (main_lessons & self.evening).sum(axis=(1, 2, 3)) / main_total
+
+        busy = self.teacher_busy(grid)
+        lessons = busy.sum(axis=-1)
+        first = np.argmax(busy, axis=-1)
+        last = self.depth - 1 - np.argmax(busy[..., ::-1], axis=-1)
+        teacher_gaps = np.where(lessons > 0, last - first + 1 - lessons, 0).sum(axis=(1, 2))
+        teacher_consecutive = (busy[..., 1:] & busy[..., :-1]).sum(axis=(1, 2, 3))
+        run = np.zeros(busy.shape[:-1], dtype=np.int64)
+        longest = np.zeros_like(run)
+        for period in range(self.depth):
+            run = (run + 1) * busy[..., period]
+            np.maximum(longest, run, out=longest)
+        teacher_max_run = longest.max(axis=(1, 2), initial=0)
+
+        hours_used = counts.sum(axis=2)[..., self.counted_course]
+        hours = self.hours[self.counted_course]
+        hours_short = np.maximum(hours - hours_used, 0).sum(axis=(1, 2))
+        hours_over = np.maximum(hours_used - hours, 0).sum(axis=(1, 2))
+
+        return {
+            "filled": filled.sum(axis=(1, 2, 3)),
+            "subjects_per_day": subjects_per_day,
+            "daily_max_violations": daily_max_violations,
+            "main_morning": main_morning,
+            "main_evening": main_evening,
+            "teacher_gaps": teacher_gaps,
+            "teacher_consecutive": teacher_consecutive,
+            "teacher_max_run": teacher_max_run,
+            "hours_short": hours_short,
+            "hours_over": hours_over,
+        }
+
+    def analyze_many(
+        self, timetables: list[dict[str, list[tuple[int, int, str]]]], chunk: int = 64
+    ) -> dict[str, np.ndarray]:
+        """
+        The metrics of many timetables, `chunk` candidates at a time to bound the memory.
+        :return: {name: array of one value per timetable}
+        """
+        results = [
+            self.metrics(self.stack(timetables[start:start + chunk]))
+            for start in range(0, len(timetables), chunk)
+        ]
+        if not results:
+            return {}
+        return {name: np.concatenate([result[name] for result in results]) for name in results[0]}
+
+    def analyze(self, timetable: dict[str, list[tuple[int, int, str]]]) -> dict[str, float]:
+        """
+        The metrics of one timetable.
+        """
+        return {
+            name: value[0].item()
+            for name, value in self.metrics(self.to_array(timetable)[np.newaxis]).items()
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("timetable", nargs="?", default="CourseScheduleOutput.csv", help="An exported csv file")
+    parser.add_argument("--settings", default=main.SETTING_FILE)
+    parser.add_argument("--encoding", choices=export.ENCODINGS, default="gbk")
+    args = parser.parse_args()
+
+    main.load(args.settings)
+    analyzer = TimetableAnalyzer(main.ALL_COURSES, main.ALL_CLASSES, main.build_courses_list())
+    print(json.dumps(
+        analyzer.analyze(export.import_data(args.timetable, args.encoding)), ensure_ascii=False, indent=2
+    ))
@@ -0,0 +1,279 @@
+"""
+Benchmarks of loading, scheduling and exporting with synthetic settings.
+
+Usage:
+    python benchmark.py --sizes 3 10 30 100 200 --repeat 3 --output bench.json
+"""
+import argparse
+import json
+import math
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+import yaml
+
+import data_processing
+import export
+import main
+from modules import ScheduleError
+
+# (name, mode, hours in a 12 days x 13 courses week, max_daily_courses, prohibit)
+SUBJECTS = [
+    ("语文", 0, 24, 2, []),
+    ("数学", 0, 31, 2, []),
+    ("英语", 0, 28, 2, []),
+    ("物理", 1, 32, 2, []),
+    ("化学", 2, 29, 2, []),
+    ("历史", 1, 12, 2, []),
+    ("体育", 3, 4, 2, []),
+    ("美术", 3, 4, 2, []),
+    ("音乐", 3, 4, 2, []),
+    ("通用技术", 3, 2, 2, []),
+    ("信息技术", 3, 2, 2, [1, 2, 3, 4]),
+    ("心理健康", 3, 1, 2, []),
+    ("生命安全", 3, 1, 2, []),
+    ("劳动教育", 3, 1, 2, []),
+    ("自习", 3, 9, 2, []),
+    ("班团德育活动", 5, 1, 2, []),
+    ("升旗", 5, 2, 2, []),
+]
+BASE_SLOTS = 12 * 13
+CLASSES_PER_GRADE = 20
+
+
+def generate_settings(
+    classes: int,
+    teachers: int = None,
+    shared_ratio: float = 1.0,
+    depth: int = 13,
+    weekdays: int = 12,
+    elective_groups: int = 2,
+    elective_hours: int = 4,
+    seed: int = 0,
+) -> dict:
+    """
+    Generate a synthetic settings dict in the format of settings.yaml.
+    Classes are split into grades of CLASSES_PER_GRADE, teachers are only shared in a grade.
+    :param classes: The number of classes
+    :param teachers: The number of shared teachers of each subject in each grade,
+        default to the least number which can teach all the shared classes
+    :param shared_ratio: The ratio of classes taught by the shared teachers of a grade,
+        the other classes get their own teachers
+    :param depth: The number of courses in a day
+    :param weekdays: The number of days of a week
+    :param elective_groups: The number of elective (走班) courses of each grade
+    :param elective_hours: The hours of each elective course
+    :param seed: The seed used to choose the shared classes
+    """
+    rng = np.random.default_rng(seed)
+    slots = depth * weekdays
+    scale = slots / BASE_SLOTS
+
+    course_schedule = []
+    for course_num in range(1, depth + 1):
+        # Minor courses are preferred in the afternoon, less in the evening (自习).
+        if course_num <= 2:
+            minor = 1
+        elif course_num < depth * 0.75:
+            minor = 5
+        else:
+            minor = 2
+        course_schedule.append({course_num: {
+            "verbose": None,
+            "probability": {0: 3, 1: 2, 2: 1, 3: minor, 4: 2},
+        }})
+
+    courses = []
+    hours = []
+    for name, mode, base_hours, max_daily, prohibit in SUBJECTS:
+        courses.append({name: {
+            "mode": mode,
+            "prohibit": [p for p in prohibit if p <= depth],
+            "max_daily_courses": max_daily,
+        }})
+        hours.append({name: max(1, round(base_hours * scale))})
+    class_nums = [
+        (index // CLASSES_PER_GRADE + 1) * 100 + index % CLASSES_PER_GRADE + 1
+        for index in range(classes)
+    ]
+    grades: dict[int, list[int]] = {}
+    for class_num in class_nums:
+        grades.setdefault(class_num // 100, []).append(class_num)
+
+    teacher_list = []
+    class_teachers: dict[int, dict[str, str]] = {class_num: {} for class_num in class_nums}
+
+    def new_teacher(teacher_name: str, course_name: str) -> str:
+        teacher_list.append({"name": teacher_name, "course": [course_name], "unwilling": []})
+        return teacher_name
+
+    for name, mode, base_hours, _, _ in SUBJECTS:
+        if mode == 5:
+            # Special courses are decided in advance, one teacher for the school.
+            teacher_name = new_teacher(f"{name}老师", name)
+            for class_num in class_nums:
+                class_teachers[class_num][name] = teacher_name
+            continue
+
+        class_hours = max(1, round(base_hours * scale))
+        # Leave half of the week free, so the shared teacher can be scheduled.
+        capacity = max(1, int(slots * 0.5) // class_hours)
+        for grade, grade_classes in grades.items():
+            shared_num = round(len(grade_classes) * shared_ratio)
+            shared_classes = set(rng.choice(grade_classes, size=shared_num, replace=False).tolist())
+            pool_size = teachers or max(1, math.ceil(shared_num / capacity))
+            pool = [new_teacher(f"{name}{grade}-{index}", name) for index in range(1, pool_size + 1)]
+            shared_index = 0
+            for class_num in grade_classes:
+                if class_num in shared_classes:
+                    class_teachers[class_num][name] = pool[shared_index % pool_size]
+                    shared_index += 1
+                else:
+                    class_teachers[class_num][name] = new_teacher(f"{name}{class_num}", name)
+
+    # Each grade has its own elective courses, all the classes of the grade take them.
+    elective_courses = []
+    for grade, grade_classes in grades.items():
+        for index in range(1, elective_groups + 1):
+            name = f"走班{grade}-{index}" if len(grades) > 1 else f"走班{index}"
+            hours.append({name: elective_hours})
+            teacher_name = new_teacher(f"{name}老师", name)
+            elective_courses.append({name: {
+                "mode": 4,
+                "teacher_name": teacher_name,
+                "prohibit": [],
+                "max_daily_courses": 2,
+                "relation_classes": grade_classes,
+            }})
+            for class_num in grade_classes:
+                class_teachers[class_num][name] = teacher_name
+
+    return {
+        "weekdays": weekdays,
+        "course_schedule": course_schedule,
+        "classes": [
+            {class_num: {"mode": 0, "teachers": class_teachers[class_num]}}
+            for class_num in class_nums
+        ],
+        "teachers": teacher_list,
+        "course_hours": {"理科": hours, "文科": hours},
+        "courses": courses,
+        "advance_decision": [
+            {"升旗": {"time": {"day": 1, "course_time": 1}, "target_class": class_nums}},
+        ],
+        "elective_courses": elective_courses,
+    }
+
+
+def write_settings(filename: str, settings: dict) -> str:
+    with open(filename, "w", encoding="utf-8") as f:
+        yaml.safe_dump(settings, f, allow_unicode=True, sort_keys=False)
+    return filename
+
+
+def bench_once(setting_file: str, export_file: str, seed: int) -> dict:
+    """
+    Time each phase of one run. "load" parses the settings without the compiled cache,
+    "load_cached" loads them from the cache, which must be written already.
+    :return: {phase: seconds}, and "error" if the schedule failed
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    main.load(setting_file, use_cache=False)
+    timings["load"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    main.load(setting_file)
+    timings["load_cached"] = time.perf_counter() - start
+
+    courses_list = main.build_courses_list()
+    classes_list = list(main.ALL_CLASSES.values())
+    course_schedule = data_processing.Schedule(
+        main.ALL_COURSES, main.ALL_TEACHERS, main.ALL_CLASSES, main.COURSE_TABLE, seed=seed
+    )
+
+    start = time.perf_counter()
+    for target_classes in main.advance_decision_classes:
+        course_schedule.advance_schedule(main.advance_decision_courses, target_classes)
+    timings["advance"] = time.perf_counter() - start
+
+    try:
+        start = time.perf_counter()
+        course_schedule.schedule_elective_courses(classes_list, courses_list)
+        timings["elective"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        course_schedule.schedule_normal_courses(classes_list, courses_list)
+        timings["main"] = time.perf_counter() - start
+    except ScheduleError as e:
+        timings["error"] = str(e)
+        return timings
+
+    start = time.perf_counter()
+    export.export_data(main.ALL_CLASSES.items(), export_file)
+    timings["export"] = time.perf_counter() - start
+    return timings
+
+
+def run_benchmarks(
+    sizes: list[int], repeat: int = 3, seed: int = 0, **settings_kwargs
+) -> list[dict]:
+    """
+    Benchmark each number of classes in `sizes`.
+    :param settings_kwargs: Passed to `generate_settings()`
+    :return: One record for each size, with the min and median time of each phase
+    """
+    records = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            setting_file = write_settings(
+                os.path.join(tmp_dir, f"settings_{size}.yaml"),
+                generate_settings(size, seed=seed, **settings_kwargs),
+            )
+            export_file = os.path.join(tmp_dir, f"output_{size}.csv")
+            # Write the compiled settings cache for "load_cached"
+            main.load(setting_file)
+
+            runs = [bench_once(setting_file, export_file, seed + index) for index in range(repeat)]
+            record = {"classes": size, "repeat": repeat, "seed": seed, **settings_kwargs}
+            record["errors"] = [run["error"] for run in runs if "error" in run]
+            for phase in ("load", "load_cached", "advance", "elective", "main", "export"):
+                values = [run[phase] for run in runs if phase in run]
+                if values:
+                    record[phase] = {"min": min(values), "median": statistics.median(values)}
+            records.append(record)
+    return records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[3, 10, 30, 100, 200])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--teachers", type=int, default=None)
+    parser.add_argument("--shared-ratio", type=float, default=1.0)
+    parser.add_argument("--depth", type=int, default=13)
+    parser.add_argument("--weekdays", type=int, default=12)
+    parser.add_argument("--elective-groups", type=int, default=2)
+    parser.add_argument("--output", default=None, help="Write the json results to this file")
+    args = parser.parse_args()
+
+    results = run_benchmarks(
+        args.sizes,
+        repeat=args.repeat,
+        seed=args.seed,
+        teachers=args.teachers,
+        shared_ratio=args.shared_ratio,
+        depth=args.depth,
+        weekdays=args.weekdays,
+        elective_groups=args.elective_groups,
+    )
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
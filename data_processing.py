@@ -1,106 +1,25 @@
 """
 Data processing module
 """
-import random
+import time as time_
+from contextlib import nullcontext
+from typing import Callable
 
-import utils
+import numpy as np
+
+from instrument import ScheduleStats
 from modules import (
     Teacher,
     CourseTime,
     Course,
     JudgeRationality,
     Class,
+    InfeasibleSlotError,
+    ScheduleError,
+    COURSE_TIMES,
     WEEKDAYS,
 )
-
-
-# Initialize list p
-def init_p(
-    probability: list[float], courses: list[Course], depth: int
-) -> (list[float], list[float]):
-    """
-    Initialize list p
-    :param probability:
-    :return: probability, courses
-    """
-    # The first day init p list
-    if depth == 1:
-        this_course_probability = probability[depth]
-        p_0, p_1, p_2, p_3, p_4 = (
-            this_course_probability[0],
-            this_course_probability[1],
-            this_course_probability[2],
-            this_course_probability[3],
-            this_course_probability[4],
-        )
-        p = []
-
-        for course in courses:
-            if course.mode == 0:
-                p.append(p_0)
-            elif course.mode == 1:
-                p.append(p_1)
-            elif course.mode == 2:
-                p.append(p_2)
-            elif course.mode == 3:
-                p.append(p_3)
-            elif course.mode == 4:
-                p.append(0)
-            elif course.mode == 5:
-                # mode=5 is special course
-                p.append(0)
-            else:
-                raise ValueError(
-                    f"Unexpected mode {course.mode}. "
-                    f"其中mode=0为必修,mode=1为物理或历史,mode=2为选课,mode=3为副科, "
-                    f"mode=4是走班(对于理科mode=1, 见classes)"
-                )
-
-        if len(p) != len(courses):
-            raise ValueError(
-                f"Unexpected length len(p)={len(courses)}, len(courses)={len(courses)}. "
-            )
-
-    # The other day init p list
-    else:
-        this_course_probability = probability[depth]
-        p_0, p_1, p_2, p_3, p_4 = (
-            this_course_probability[0],
-            this_course_probability[1],
-            this_course_probability[2],
-            this_course_probability[3],
-            this_course_probability[4],
-        )
-        p = []
-
-        for course in courses:
-            if course.mode == 0:
-                p.append(p_0)
-            elif course.mode == 1:
-                p.append(p_1)
-            elif course.mode == 2:
-                p.append(p_2)
-            elif course.mode == 3:
-                p.append(p_3)
-            elif course.mode == 4:
-                p.append(0)
-            elif course.mode == 5:
-                # mode=5 is special course
-                p.append(0)
-            else:
-                raise ValueError(
-                    f"Unexpected mode {course.mode}. "
-                    f"其中mode=0为必修,mode=1为物理或历史,mode=2为选课,mode=3为副科, "
-                    f"mode=4是走班(对于理科mode=1, 见classes)"
-                )
-
-        if len(p) != len(courses):
-            raise ValueError(
-                f"Unexpected length len(p)={len(courses)}, len(courses)={len(courses)}. "
-            )
-
-    # Return
-    return p, courses
+from probability import DemandPool, ProbabilityTable, PROBABILITY_MODES
 
 
 class Schedule:
@@ -108,7 +27,32 @@ class Schedule:
     A class for schedule courses.
     """
 
-    def __init__(self, all_courses, all_teachers, all_classes, course_table):
+    # Whether the same settings always give the same timetable
+    deterministic = False
+
+    def __init__(
+        self, all_courses, all_teachers, all_classes, course_table,
+        seed: int | np.random.SeedSequence = None, rng: np.random.Generator = None,
+        selection: str = "masked", stats: ScheduleStats = None,
+        elective_max_attempts: int = 10000, time_budget: float = None,
+        checkpoint: Callable[[dict], None] = None,
+    ):
+        """
+        :param seed: The seed of the random generator, ignored if `rng` is given
+        :param rng: The random generator of this schedule
+        :param selection: How a course is chosen for each course time.
+            "masked": draw only from the feasible courses of the course time.
+            "rejection": draw from all courses and retry until a rational one.
+        :param stats: Record the draws, rejections, exclusions and times into it if given
+        :param elective_max_attempts: The most course times tried to place the elective blocks
+        :param time_budget: Stop after so many seconds from now. With a time budget the
+            schedule never raises for an infeasible course time or elective course, it
+            leaves them unfilled, see `report()`.
+        :param checkpoint: Called with `state()` after the elective courses and after each
+            class, such as to save it to a file. It is not called after the time budget ran out.
+        """
+        if selection not in ("masked", "rejection"):
+            raise ValueError(f"Unexpected selection {selection!r}")
         self.ALL_COURSES = all_courses
         self.ALL_TEACHERS: dict[str, Teacher] = all_teachers  # busy state save in it!
         self.ALL_CLASSES: dict[str, Class] = all_classes
@@ -117,43 +61,139 @@ class Schedule:
         self.decided_courses: list[tuple[CourseTime, Course]] = []
         self.now_decided_courses: list[tuple[CourseTime, Course]] = []
 
-        self.decay_factor: float = 0.985
+        self.probability_table = ProbabilityTable(
+            course_table.course_probability, course_table.course_depth
+        )
+        # All the random draws of this schedule come from this generator.
+        self.rng: np.random.Generator = rng if rng is not None else np.random.default_rng(seed)
+        self.selection = selection
+        self.stats: ScheduleStats | None = stats
+        self.elective_max_attempts = elective_max_attempts
+
+        self.time_budget = time_budget
+        self.start_time = time_.perf_counter()
+        self.deadline = None if time_budget is None else self.start_time + time_budget
+        self.timed_out = False
+        self.errors: list[str] = []
+
+        self.checkpoint = checkpoint
+        # The state to continue from, see `resume()`
+        self.resume_state: dict | None = None
+
+    def _phase(self, name: str):
+        """
+        Time a phase if the stats is enabled.
+        """
+        if self.stats is None:
+            return nullcontext()
+        return self.stats.phase(name)
+
+    def _expired(self) -> bool:
+        if self.deadline is not None and time_.perf_counter() >= self.deadline:
+            self.timed_out = True
+        return self.timed_out
 
-    def _decay(self, probability_list: list[float]) -> list[float]:
-        new_probability_list: list[float] = []
-        for p in probability_list:
-            new_probability_list.append(p * self.decay_factor)
-        new_probability_list = utils.normalize_list(new_probability_list)
-        return new_probability_list
+    def _give_up(self, error: ScheduleError) -> None:
+        """
+        Raise the error, or record it if there is a time budget.
+        """
+        if self.time_budget is None:
+            raise error
+        self.errors.append(str(error))
+
+    def report(self, target_classes: list[Class] = None) -> dict:
+        """
+        :param target_classes: The classes to check, default to all the classes
+        :return: {"complete": bool, "timed_out": bool, "unfilled": [(class_num, day,
+            course_time), ...], "errors": [...], "elapsed": seconds}
+        """
+        if target_classes is None:
+            target_classes = list(self.ALL_CLASSES.values())
+        unfilled = [
+            (each_class.class_num, course_time.day, course_time.course_time)
+            for each_class in target_classes
+            for course_time in COURSE_TIMES
+            if not each_class.cheek_decided_courses(course_time)
+        ]
+        return {
+            "complete": not unfilled,
+            "timed_out": self.timed_out,
+            "unfilled": unfilled,
+            "errors": list(self.errors),
+            "elapsed": time_.perf_counter() - self.start_time,
+        }
+
+    def state(self, phase: str, next_class: int = 0) -> dict:
+        """
+        The state to continue this schedule from, see `resume()`. The demand pool is not
+        in it, the pool is refilled for each class.
+        :param phase: The next phase, "elective" or "normal"
+        :param next_class: The index of the next class of the normal courses
+        """
+        store = next(iter(self.ALL_CLASSES.values())).store
+        return {
+            "phase": phase,
+            "next_class": next_class,
+            "class_grid": store.class_grid.copy(),
+            "teacher_grid": store.teacher_grid.copy(),
+            "rng": self.rng.bit_generator.state,
+            "errors": list(self.errors),
+        }
+
+    def _save_checkpoint(self, phase: str, next_class: int = 0) -> None:
+        if self.checkpoint is not None and not self.timed_out:
+            self.checkpoint(self.state(phase, next_class))
+
+    def resume(self, state: dict) -> None:
+        """
+        Put the decided courses and teacher busy state of `state()` into the loaded classes
+        and teachers (after `advance_schedule()`), and restore the random generator, so the
+        next call continues from its phase with the same draws. The stats only count the
+        work after it.
+        :raise ValueError: If the state does not match the loaded settings
+        """
+        store = next(iter(self.ALL_CLASSES.values())).store
+        if (
+            state["class_grid"].shape != store.class_grid.shape
+            or state["teacher_grid"].shape != store.teacher_grid.shape
+        ):
+            raise ValueError("The checkpoint does not match the loaded settings!")
+        courses = store.registry.courses
+        # Only the course times which are not decided yet, such as the advance decisions
+        # are already there, in the order they were decided.
+        for class_obj in self.ALL_CLASSES.values():
+            row = state["class_grid"][class_obj.id]
+            for time_id in np.flatnonzero((row >= 0) & (store.class_grid[class_obj.id] < 0)).tolist():
+                class_obj.add_decided_course([(COURSE_TIMES[time_id], courses[row[time_id]])])
+        for teacher in self.ALL_TEACHERS.values():
+            row = state["teacher_grid"][teacher.id]
+            for time_id in np.flatnonzero((row >= 0) & (store.teacher_grid[teacher.id] < 0)).tolist():
+                teacher.add_busy_course(courses[row[time_id]], COURSE_TIMES[time_id])
+        self.rng.bit_generator.state = state["rng"]
+        self.errors = list(state["errors"])
+        self.resume_state = state
 
     def _choose_from_courses(
         self,
-        courses_,
-        course_probability_,
-        current_class,
-        current_course_num,
+        pool: DemandPool,
+        current_class: Class,
+        current_course_num: int,
         time: CourseTime,
-    ):
+    ) -> (int, Course, Teacher):
         """
-        :return: In sequence is the: chosen course, courses (the rest of the courses),
-            course_probability, teacher,
-        the probability list before set to zero
+        Draw a course from `pool` and judge its rationality.
+        The course is excluded from `pool` if it should not be drawn again at `time`
+        (such as its daily max courses is reached), the caller restores it.
+        :return: In sequence is the: index of the chosen course, chosen course, teacher.
+            The index and course are None if the chosen course is not rational.
         """
-        courses = courses_.copy()
-        course_probability = course_probability_.copy()
-
-        elements_with_index = list(enumerate(zip(courses, course_probability)))
-        weights = [item[1][1] for item in elements_with_index]
         try:
-            index, (chosen_course, _) = random.choices(
-                elements_with_index, weights=weights, k=1
-            )[0]
-            chosen_course: Course
-
+            index = pool.choose(current_course_num, self.rng)
         except ValueError as e:
-            print("weights", weights)
-            print("courses", courses)
-            raise ValueError("Total of weights must be greater than zero. \n" + str(e))
+            raise InfeasibleSlotError(
+                current_class.class_num, time, "Total of weights must be greater than zero. \n" + str(e)
+            )
+        chosen_course: Course = pool.courses[index]
 
         teacher = current_class.teachers.get(chosen_course.name)
 
@@ -167,22 +207,73 @@ class Schedule:
             all_classes=self.ALL_CLASSES,
         )
         (judge_output, whether_set_to_zero) = judge_rationality()
+        if self.stats is not None:
+            self.stats.add_draw(current_class.class_num, time.id)
+            if not judge_output:
+                self.stats.add_rejection(judge_rationality.reason)
 
         if judge_output:
-            courses.pop(index)
-            course_probability.pop(index)
-            course_probability_.pop(index)
-            return (
-                chosen_course,
-                courses,
-                course_probability,
-                teacher,
-                course_probability_,
-            )
+            return index, chosen_course, teacher
         else:
             if whether_set_to_zero:
-                course_probability[index] = 0
-            return None, courses, course_probability, teacher, course_probability_
+                pool.exclude(index)
+            return None, None, teacher
+
+    def _feasible_courses(
+        self, courses: list[Course], current_class: Class, time: CourseTime
+    ) -> np.ndarray:
+        """
+        Judge the rationality of each course at `time` in one pass. The same rules as
+        `JudgeRationality` (the class busy time is judged by the caller).
+        :param courses: Distinct courses
+        :return: A bool array, True if the course can be put at `time`
+        """
+        feasible = np.zeros(len(courses), dtype=bool)
+        bit = time.bit
+        stats = self.stats
+        available = current_class.store.class_available[current_class.id]
+        daily_full = current_class.daily_full_courses(time.day, courses).tolist()
+        for index, course in enumerate(courses):
+            teacher: Teacher = current_class.teachers.get(course.name)
+            if teacher is None:
+                continue
+            # unavailable (unwilling, prohibit), teacher busy and daily max courses
+            if not available[course.id] & bit:
+                if stats is not None:
+                    stats.add_exclusion("unavailable")
+                continue
+            if teacher.cheek_busy_courses(time):
+                if stats is not None:
+                    stats.add_exclusion("teacher_busy")
+                continue
+            if daily_full[index]:
+                if stats is not None:
+                    stats.add_exclusion("daily_max")
+                continue
+            feasible[index] = True
+        return feasible
+
+    def _choose_from_feasible_courses(
+        self, pool: DemandPool, current_class: Class, time: CourseTime
+    ) -> (int, Course, Teacher):
+        """
+        Draw a course from the feasible courses at `time` only.
+        The courses which are not feasible are excluded from `pool`, the caller restores them.
+        :raise InfeasibleSlotError: If there is no feasible course.
+        :return: In sequence is the: index of the chosen course, chosen course, teacher.
+        """
+        feasible = self._feasible_courses(pool.courses, current_class, time)
+        for index in np.flatnonzero(~feasible).tolist():
+            pool.exclude(index)
+        try:
+            index = pool.choose(time.course_time, self.rng)
+        except ValueError:
+            raise InfeasibleSlotError(current_class.class_num, time) from None
+
+        if self.stats is not None:
+            self.stats.add_draw(current_class.class_num, time.id)
+        chosen_course = pool.courses[index]
+        return index, chosen_course, current_class.teachers.get(chosen_course.name)
 
     def advance_schedule(
         self,
@@ -193,84 +284,148 @@ class Schedule:
         Decide on some courses in advance.
         TODO: 'target_classes' not yet enabled.
         """
-        # If 'target_classes' is None, then set it to all classes.
-        if target_classes is None:
-            target_classes = []
-            for _, each_class_obj in self.ALL_CLASSES.items():
-                target_classes.append(each_class_obj)
-
-        # For each advanced scheduled courses.
-        for course_time, course in advance_schedule:
-            # For each class, add advanced scheduled courses to the target classes.
-            for each_class_obj in target_classes:
-                each_class_obj.add_decided_course([(course_time, course)])
-                
-        # Set teacher busy state.
-        for course_time, course in advance_schedule:
-            for each_class_obj in target_classes:
-                target_teacher: Teacher = each_class_obj.teachers.get(course.name)
-
-                # XXX Beater cheek it!!
-                if not target_teacher.cheek_busy_courses(course_time):
-                    target_teacher.add_busy_course(course, course_time)
+        with self._phase("advance"):
+            # If 'target_classes' is None, then set it to all classes.
+            if target_classes is None:
+                target_classes = []
+                for _, each_class_obj in self.ALL_CLASSES.items():
+                    target_classes.append(each_class_obj)
+
+            # For each advanced scheduled courses.
+            for course_time, course in advance_schedule:
+                # For each class, add advanced scheduled courses to the target classes.
+                for each_class_obj in target_classes:
+                    each_class_obj.add_decided_course([(course_time, course)])
+
+            # Set teacher busy state.
+            for course_time, course in advance_schedule:
+                for each_class_obj in target_classes:
+                    target_teacher: Teacher = each_class_obj.teachers.get(course.name)
+
+                    # XXX Beater cheek it!!
+                    if not target_teacher.cheek_busy_courses(course_time):
+                        target_teacher.add_busy_course(course, course_time)
+
+    def _elective_group(
+        self, target_classes: list[Class], course_obj: Course
+    ) -> tuple[list[Class], list[Teacher]]:
+        """
+        The classes of `target_classes` which take the elective course (they have a teacher
+        for it), and their distinct teachers of it. They must have it at the same time.
+        """
+        classes = [each_class for each_class in target_classes if course_obj.name in each_class.teachers]
+        teachers = []
+        for each_class in classes:
+            teacher = each_class.teachers[course_obj.name]
+            if teacher not in teachers:
+                teachers.append(teacher)
+        return classes, teachers
+
+    def _elective_times(
+        self, course_obj: Course, classes: list[Class], teachers: list[Teacher]
+    ) -> list[CourseTime]:
+        """
+        The course times which are free for all the classes and teachers of a group at the
+        same time: the intersection of their availability masks (unwilling, prohibit) and
+        free course times, without the days which are full of the course for any class.
+        """
+        busy = 0
+        available = -1
+        for each_class in classes:
+            busy |= each_class.decided_mask
+            available &= each_class.available(course_obj)
+        for teacher in teachers:
+            busy |= teacher.busy_mask
+        free = available & ~busy
+        full_days = set()
+        if classes:
+            full_days = set((np.flatnonzero(classes[0].store.full_days(classes, course_obj)) + 1).tolist())
+        return [
+            course_time for course_time in COURSE_TIMES
+            if free & course_time.bit
+            and course_time.day not in full_days
+        ]
+
+    def _order_elective_times(
+        self, course_obj: Course, classes: list[Class], times: list[CourseTime]
+    ) -> list[CourseTime]:
+        """
+        The order to try the available times of an elective block, random here.
+        """
+        return [times[index] for index in self.rng.permutation(len(times))]
+
+    @staticmethod
+    def _place_elective(
+        course_obj: Course, classes: list[Class], teachers: list[Teacher], course_time: CourseTime
+    ) -> None:
+        for each_class in classes:
+            each_class.add_decided_course([(course_time, course_obj)])
+        for teacher in teachers:
+            teacher.add_busy_course(course_obj, course_time)
+
+    @staticmethod
+    def _remove_elective(
+        classes: list[Class], teachers: list[Teacher], course_time: CourseTime
+    ) -> None:
+        for each_class in classes:
+            each_class.remove_decided_course(course_time)
+        for teacher in teachers:
+            teacher.remove_busy_course(course_time)
 
     def _schedule_elective_classes(
         self, target_classes: list[Class], elective_course: list[Course]
     ):
         """
         Special course (such as 走1, 走2)
+        Each hour of an elective course is a block, which puts the course into all the
+        classes of its group and makes their teachers busy at one time, or not at all.
+        The blocks are placed by a depth first search, the block with the fewest available
+        times first, trying at most `self.elective_max_attempts` times.
         :param target_classes: The class to for schedule
-        :param elective_course: 特殊课程列表
-        :return:
+        :param elective_course: 特殊课程列表, each course is repeated by its hours
+        :raise ScheduleError: If there is no available time or the attempts run out
         """
-        # 走班课抽取
-        # random choose course time
-        chosen_time: list[CourseTime] = []
-        # cyclic each course (index)
-        # cyclic each course (index)
-        for index, _ in enumerate(elective_course):
-            while True:  # 添加这个循环
-                course_obj: Course = elective_course[index]
-                while True:
-                    random_time = CourseTime(
-                        random.randint(1, len(WEEKDAYS)),
-                        random.randint(1, self.COURSE_TABLE.course_depth),
+        # Keyed by `Course.id`
+        groups: dict[int, tuple[list[Class], list[Teacher]]] = {}
+        for course_obj in elective_course:
+            if course_obj.id not in groups:
+                groups[course_obj.id] = self._elective_group(target_classes, course_obj)
+        blocks = [course_obj for course_obj in elective_course if groups[course_obj.id][0]]
+        attempts = 0
+
+        def search(remaining: list[int]) -> bool:
+            nonlocal attempts
+            if not remaining:
+                return True
+            # The most constrained block first
+            chosen, chosen_times = -1, None
+            for index in remaining:
+                times = self._elective_times(blocks[index], *groups[blocks[index].id])
+                if chosen_times is None or len(times) < len(chosen_times):
+                    chosen, chosen_times = index, times
+                    if not times:
+                        return False
+            course_obj = blocks[chosen]
+            classes, teachers = groups[course_obj.id]
+            rest = [index for index in remaining if index != chosen]
+            for course_time in self._order_elective_times(course_obj, classes, chosen_times):
+                attempts += 1
+                if self._expired():
+                    raise ScheduleError("The time budget ran out while placing the elective courses!")
+                if attempts > self.elective_max_attempts:
+                    raise ScheduleError(
+                        f"Can not place the elective courses in {self.elective_max_attempts} attempts!"
                     )
-                    if random_time in chosen_time:
-                        continue
-                    else:
-                        break
+                self._place_elective(course_obj, classes, teachers, course_time)
+                if search(rest):
+                    return True
+                self._remove_elective(classes, teachers, course_time)
+                if self.stats is not None:
+                    self.stats.add_elective_retry()
+            return False
 
-                for each_class in self.ALL_CLASSES:
-                    each_class: str
-                    each_class_obj: Class = self.ALL_CLASSES[each_class]
-                    if each_class_obj in target_classes:
-                        each_class_obj: Class
-
-                        # Prepare arguments
-                        teacher = each_class_obj.teachers[course_obj.name]
-
-                        judge_rationality = JudgeRationality(
-                            course_obj,
-                            random_time.course_time,
-                            teacher,
-                            random_time,
-                            each_class_obj,
-                            all_classes=self.ALL_CLASSES,
-                        )
-                        whether_rationality, whether_set_to_zero = judge_rationality()
-
-                        if not whether_rationality:  # 如果判断结果不合理
-                            break  # 跳出当前循环，重新选择课程
-
-                        # ...
-                        each_class_obj.add_decided_course([(random_time, course_obj)])
-
-                else:  # 如果所有的班级都合理，就跳出循环，继续执行后面的代码
-                    break
-
-            # set the elective course
-            chosen_time.append(random_time)
+        if not search(list(range(len(blocks)))):
+            raise ScheduleError("There is no time for the elective courses which satisfies the settings!")
 
     def __call__(self, target_classes: list[Class], courses_: list) -> list[Class]:
         """
@@ -279,96 +434,96 @@ class Schedule:
         :param courses_:
         :return:
         """
-
-        depth = self.COURSE_TABLE.course_depth
-        probability = self.COURSE_TABLE.course_probability
-
-        p = None
-        # This list is used to save the p before set to zero.
-        # When this day is end, then set the real p list to this list.
-        p_before_set_to_zero: list = []
-
         # schedule elective course secondly.
+        if self.resume_state is None or self.resume_state["phase"] == "elective":
+            self.schedule_elective_courses(target_classes, courses_)
+            self._save_checkpoint("normal")
+        # Then the normal courses.
+        self.schedule_normal_courses(target_classes, courses_)
+        return self.ALL_CLASSES
+
+    def schedule_elective_courses(self, target_classes: list[Class], courses_: list) -> None:
+        """
+        Schedule the elective courses (mode=4) of a course list for given classes.
+        """
         # - find elective course and class
         elective_courses: list[Course] = []
         for index, course in enumerate(courses_):
             if course.mode == 4:
                 elective_courses.append(course)
         # - schedule elective course
-        self._schedule_elective_classes(target_classes, elective_courses)
+        with self._phase("elective"):
+            try:
+                self._schedule_elective_classes(target_classes, elective_courses)
+            except ScheduleError as e:
+                self._give_up(e)
 
-        # foreach classes
-        for target_class in target_classes:
-            # 'courses' need to play role in every 'target_class' foreach 'target_classes'
-            courses = courses_.copy()
+    def schedule_normal_courses(self, target_classes: list[Class], courses_: list) -> None:
+        """
+        Schedule the courses drawn by probability (mode=0~3) for given classes, after the
+        advance decided and elective courses.
+        """
+        depth = self.COURSE_TABLE.course_depth
+        phase_start = time_.perf_counter()
 
-            # First init p list.
-            if not p:
-                # p, courses = init_p(probability, courses, depth)
+        # Only the courses which can be drawn by probability are left, counted by their hours.
+        pool = DemandPool(
+            [course for course in courses_ if course.mode in PROBABILITY_MODES], self.probability_table
+        )
 
-                # Init p list on the first day of the week. (is if not p)
-                p, courses = init_p(probability, courses, 1)
+        start = 0
+        if self.resume_state is not None and self.resume_state["phase"] == "normal":
+            start = self.resume_state["next_class"]
+        self.resume_state = None
 
-                # remove zero p courses
-                while 0 in p:
-                    for index, _ in enumerate(p):
-                        if p[index] == 0:
-                            p.pop(index)
-                            courses.pop(index)
-                            break
+        # foreach classes
+        for class_index in range(start, len(target_classes)):
+            target_class = target_classes[class_index]
+            class_start = time_.perf_counter()
+            # The hours of every course are refilled for each class.
+            pool.reset()
 
             # foreach work days
-            vscode_stop = False
             for day in WEEKDAYS:
+                if self.timed_out:
+                    break
                 for each_course_time in range(1, depth + 1):
-                    # Init p list if each_course != 1
-                    if each_course_time != 1:
-                        p, courses = init_p(probability, courses, each_course_time)
-
-                    if vscode_stop:
-                        if not p or not courses:
-                            print("所有课程均已拍完, 但一大周没有结束, 请检查课时是否符合!")
-                            print("now day", day, "\n", "now course", each_course_time)
-                            print("weekdays", WEEKDAYS)
-                            quit(0)
                     current_time = CourseTime(day, each_course_time)
 
+                    # If the class is busy, then skip this time.
+                    if target_class.cheek_decided_courses(current_time):
+                        continue
+                    if self._expired():
+                        break
+
+                    choose_index = None
                     choose_course = None
                     choose_teacher: Teacher = None
-
-                    # Whether skip this time
-                    whether_skip_this_time = False
-
-                    while choose_course is None:
-                        # TODO Judge whether the time had been scheduled.                        
-                        # Init JudgeRationality object.
-                        judge_rationality = JudgeRationality(
-                            None,
-                            current_time.course_time,
-                            None,
-                            current_time,
-                            target_class,
-                            self.ALL_CLASSES,
-                        )
-                        if judge_rationality.judge_class_busy_time():
-                            # If the class is busy, then skip this time.
-                            whether_skip_this_time = True
-                            break
-
-                        # Choose normal course follow the p list.
-                        (
-                            choose_course,
-                            courses,
-                            p,
-                            choose_teacher,
-                            p_before_set_to_zero,
-                        ) = self._choose_from_courses(
-                            courses, p, target_class, each_course_time, current_time
-                        )
-                    
-                    # If this time is skipped, then continue this for loop.
-                    if whether_skip_this_time:
+                    try:
+                        if self.selection == "masked":
+                            (
+                                choose_index,
+                                choose_course,
+                                choose_teacher,
+                            ) = self._choose_from_feasible_courses(pool, target_class, current_time)
+                        while choose_course is None and not self._expired():
+                            # Choose normal course by the weights of the pool.
+                            (
+                                choose_index,
+                                choose_course,
+                                choose_teacher,
+                            ) = self._choose_from_courses(
+                                pool, target_class, each_course_time, current_time
+                            )
+                    except InfeasibleSlotError as e:
+                        # Leave the course time unfilled if there is a time budget.
+                        self._give_up(e)
                         continue
+                    finally:
+                        pool.restore()
+                    if choose_course is None:
+                        break
+                    pool.take(choose_index)
 
                     # set teacher in busy state this time('current_time')
                     self.ALL_TEACHERS.get(choose_teacher.name).add_busy_course(
@@ -377,26 +532,19 @@ class Schedule:
 
                     self.now_decided_courses.append((current_time, choose_course))
 
-                    # decay the p. In order to promote the low probability course.
-                    p = self._decay(p)
-
-                    # p_before_set_to_zero = self._decay(p_before_set_to_zero)
-                    for index, _ in enumerate(p):
-                        if p[index] != 0:
-                            p_before_set_to_zero[index] = p[index]
-
                     # Add to self.ALL_CLASSES
                     now_classes_obj: Class = self.ALL_CLASSES[
                         str(target_class.class_num)
                     ]
                     now_classes_obj.add_decided_course([(current_time, choose_course)])
 
-                # add 'decided_courses' to target_class member
-                target_class.add_decided_course(self.decided_courses)
-                # clear self.decided_courses
-                self.now_decided_courses = []
-                # reset p
-                p = p_before_set_to_zero
+            # add 'decided_courses' to target_class member
+            target_class.add_decided_course(self.decided_courses)
+            # clear self.decided_courses
+            self.now_decided_courses = []
+            if self.stats is not None:
+                self.stats.add_class_time(target_class.class_num, time_.perf_counter() - class_start)
+            self._save_checkpoint("normal", class_index + 1)
 
         # Add to self.decided_courses
         for course_time, course in self.now_decided_courses:
@@ -409,4 +557,5 @@ class Schedule:
 
             self.decided_courses.append((course_time, course))
 
-        return self.ALL_CLASSES
+        if self.stats is not None:
+            self.stats.add_phase_time("normal", time_.perf_counter() - phase_start)
@@ -3,41 +3,124 @@
 Export data to csv file.
 """
 
-import pandas as pd
-from modules import Course, CourseTime, Teacher, Class
+import csv
 
+from modules import Course, CourseTime, Teacher, Class, COURSE_TIMES
 
-def export_data(data, filename):
+ENCODINGS = ("gbk", "utf-8")
+
+
+def export_data(data, filename, encoding="gbk"):
     """
     Export data to csv file.
+    The file is written from scratch: a "Day" and a "CourseTime" column, then one column
+    for each class, and one row for each course time which any class has a course at.
+    :param data: [(class_num, class_obj), ...], decided_courses is a mapping or a list of
+        (CourseTime, Course)
+    :param encoding: "gbk" or "utf-8"
     """
-    print("Target filename:", filename)
-
-    # Open csv file.
-    df = pd.read_csv(filename, encoding="gbk")
-
-    # Foreach class
+    # One pass over the classes, a column for each: {course time id: course name}
+    class_nums: list[str] = []
+    columns: list[dict[int, str]] = []
     for cur_class_num, cur_class_obj in data:
         cur_class_num: str
         cur_class_obj: Class
 
-        decided_courses: tuple[CourseTime, Course] = cur_class_obj.decided_courses
-        now_row = 0
+        column = {
+            cur_course_time.id: cur_course.name
+            for cur_course_time, cur_course in dict(cur_class_obj.decided_courses).items()
+        }
+        class_nums.append(str(cur_class_num))
+        columns.append(column)
+
+    _write_columns(filename, encoding, class_nums, columns)
+
+
+def export_teacher_data(all_teachers, filename, encoding="gbk"):
+    """
+    Export the timetable of each teacher to csv file, a column for each teacher.
+    Each cell is the class numbers and the course, such as "101/102 走班1".
+    It reads the inverted index `Teacher.lessons`, not the classes.
+    :param all_teachers: {teacher_name: teacher_obj}
+    """
+    names: list[str] = []
+    columns: list[dict[int, str]] = []
+    for teacher_name, teacher_obj in all_teachers.items():
+        teacher_obj: Teacher
+        if not teacher_obj.lessons:
+            continue
+        names.append(teacher_name)
+        columns.append({
+            cur_course_time.id: "/".join(cur_class.class_num for cur_class, _ in lessons)
+            + " " + lessons[0][1].name
+            for cur_course_time, lessons in teacher_obj.lessons.items()
+        })
+    _write_columns(filename, encoding, names, columns)
+
+
+def export_course_data(all_courses, filename, encoding="gbk"):
+    """
+    Export the classes of each course at each course time to csv file, a column for each
+    course, such as "101/103". It reads the inverted index `Course.classes_at`.
+    :param all_courses: {course_name: course_obj}
+    """
+    names: list[str] = []
+    columns: list[dict[int, str]] = []
+    for course_name, course_obj in all_courses.items():
+        course_obj: Course
+        if not course_obj.classes_at:
+            continue
+        names.append(course_name)
+        columns.append({
+            cur_course_time.id: "/".join(cur_class.class_num for cur_class in classes)
+            for cur_course_time, classes in course_obj.classes_at.items()
+        })
+    _write_columns(filename, encoding, names, columns)
+
 
-        # Set column type.
-        df[cur_class_num] = df[cur_class_num].astype(str)
+def _write_columns(filename, encoding, names: list[str], columns: list[dict[int, str]]):
+    """
+    Stream a "Day", a "CourseTime" and the named columns, one row for each course time
+    which any column has.
+    :param columns: {course time id: cell} for each name
+    """
+    print("Target filename:", filename)
+    time_ids = set()
+    for column in columns:
+        time_ids.update(column)
 
-        # Foreach course.
-        for cur_course_time, cur_course in decided_courses:
-            cur_course_time: CourseTime
-            cur_course: Course
+    def rows():
+        for time_id in sorted(time_ids):
+            cur_course_time: CourseTime = COURSE_TIMES[time_id]
+            yield [cur_course_time.day, cur_course_time.course_time] + [
+                column.get(time_id, "") for column in columns
+            ]
 
-            # Set value.
-            df.loc[now_row, cur_class_num] = cur_course.name
-            df.loc[now_row, "Day"] = cur_course_time.day
-            df.loc[now_row, "CourseTime"] = cur_course_time.course_time
-            now_row += 1
+    with open(filename, "w", encoding=encoding, newline="", buffering=1 << 16) as f:
+        writer = csv.writer(f)
+        writer.writerow(["Day", "CourseTime"] + names)
+        writer.writerows(rows())
 
-    # Save.
-    df.to_csv(filename, index=False, encoding="gbk")
 
+def import_data(filename, encoding="gbk") -> dict[str, list[tuple[int, int, str]]]:
+    """
+    Read a csv file written by `export_data()` back.
+    :return: {class_num: [(day, course_time, course_name), ...]}, the format of
+        `main.timetable_of()`
+    """
+    timetable: dict[str, list[tuple[int, int, str]]] = {}
+    with open(filename, "r", encoding=encoding, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        class_nums = header[2:]
+        for class_num in class_nums:
+            timetable[class_num] = []
+        for row in reader:
+            if not row or not row[0]:
+                continue
+            # The old pandas exporter wrote the numbers as float, such as "1.0"
+            day, course_time = int(float(row[0])), int(float(row[1]))
+            for class_num, course_name in zip(class_nums, row[2:]):
+                if course_name and course_name != "nan":
+                    timetable[class_num].append((day, course_time, course_name))
+    return timetable
@@ -0,0 +1,94 @@
+"""
+Instrumentation of the course schedule: retry counters and timers.
+"""
+import json
+import time
+from contextlib import contextmanager
+
+# The rejection reasons of JudgeRationality
+REJECT_REASONS = ("unavailable", "teacher_busy", "daily_max", "class_busy")
+# The reasons a course is excluded before a masked draw
+EXCLUDE_REASONS = ("unavailable", "teacher_busy", "daily_max")
+
+
+class ScheduleStats(object):
+    """
+    Counters and timers recorded by `data_processing.Schedule` when it is given one.
+    A Schedule without stats skips all the recording.
+
+    "rejections" counts the failed draws of the rejection selection, "exclusions"
+    counts the courses left out before each draw of the masked selection, so the two
+    selections fill different counters and are not compared by them.
+    """
+
+    def __init__(self):
+        # {class_num: {course time id: number of draws}}
+        self.draws: dict[str, dict[int, int]] = {}
+        self.rejections: dict[str, int] = {reason: 0 for reason in REJECT_REASONS}
+        self.exclusions: dict[str, int] = {reason: 0 for reason in EXCLUDE_REASONS}
+        self.elective_retries: int = 0
+        self.backtracks: int = 0
+        self.phase_times: dict[str, float] = {}
+        self.class_times: dict[str, float] = {}
+
+    def add_draw(self, class_num: str, time_id: int, num: int = 1) -> None:
+        class_draws = self.draws.setdefault(class_num, {})
+        class_draws[time_id] = class_draws.get(time_id, 0) + num
+
+    def add_rejection(self, reason: str, num: int = 1) -> None:
+        self.rejections[reason] = self.rejections.get(reason, 0) + num
+
+    def add_exclusion(self, reason: str, num: int = 1) -> None:
+        self.exclusions[reason] = self.exclusions.get(reason, 0) + num
+
+    def add_elective_retry(self) -> None:
+        self.elective_retries += 1
+
+    def add_backtrack(self) -> None:
+        self.backtracks += 1
+
+    def add_class_time(self, class_num: str, seconds: float) -> None:
+        self.class_times[class_num] = self.class_times.get(class_num, 0.0) + seconds
+
+    def add_phase_time(self, name: str, seconds: float) -> None:
+        self.phase_times[name] = self.phase_times.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Add the wall time of the with block to the phase `name`.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase_time(name, time.perf_counter() - start)
+
+    def to_dict(self) -> dict:
+        total_draws = sum(sum(class_draws.values()) for class_draws in self.draws.values())
+        slots = sum(len(class_draws) for class_draws in self.draws.values())
+        return {
+            "total_draws": total_draws,
+            "draws_per_slot": total_draws / slots if slots else 0.0,
+            "max_draws": max(
+                (num for class_draws in self.draws.values() for num in class_draws.values()),
+                default=0,
+            ),
+            "rejections": dict(self.rejections),
+            "exclusions": dict(self.exclusions),
+            "elective_retries": self.elective_retries,
+            "backtracks": self.backtracks,
+            "phase_times": dict(self.phase_times),
+            "class_times": dict(self.class_times),
+            "draws": {
+                class_num: {str(time_id): num for time_id, num in class_draws.items()}
+                for class_num, class_draws in self.draws.items()
+            },
+        }
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, **kwargs)
+
+    def dump(self, filename: str) -> None:
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write(self.to_json(indent=2))
@@ -14,19 +14,42 @@ course_schedule_depth: 课程表深度。
 
 函数
 load(): 加载设置文件，并初始化全局变量。
+build_courses_list(): 根据课时生成课程列表。
+run_schedule(): 加载后完成一次排课, 可在每个班级排完后写入检查点(checkpoint), 中断后用 --resume 继续。
+run_schedule_anytime(): 在限定时间内排课, 返回未排满课时最少的结果(可能不完整)。
+timetable_of() / apply_timetable(): 课程表与可序列化数据之间的转换。
+
+load()会把编译后的设置缓存到设置文件旁的__pycache__中, 设置文件不变时跳过yaml解析, 可用 --no-cache 关闭。
+主程序可以用 --optimize 在排课后进行局部搜索优化(见optimize.py)。
 
 主程序
 在主程序中，首先调用load()函数加载设置文件。然后，根据课程时间加载课程，并生成课程表。最后，打印出调度后的班级。
 """
-import yaml
-from functools import cmp_to_key
+import hashlib
+import json
+import os
+import pickle
+import time as time_
+from typing import Callable
+
+import numpy as np
 
 import data_processing
 import modules
-import utils
-import export
+
+
+def _backtracking_solver(*args, **kwargs) -> data_processing.Schedule:
+    # Import the solver only when it is used, to keep `import main` fast.
+    import solver
+    return solver.BacktrackingSolver(*args, **kwargs)
+
 
 SETTING_FILE = "settings.yaml"
+# The schedule engines: the random scheduler and the deterministic backtracking solver.
+ENGINES = {
+    "random": data_processing.Schedule,
+    "backtrack": _backtracking_solver,
+}
 COURSE_TABLE: modules.CourseTable = None  # Initialize to None
 COURSE_HOURS = {}
 
@@ -41,171 +64,305 @@ course_schedule_depth = -1
 advance_decision_courses: list[tuple[modules.CourseTime, modules.Course]] = []
 advance_decision_classes: list[list[modules.Class]] = []
 
+# Bump it when the models change, so the old compiled settings are not loaded.
+CACHE_VERSION = 4
+
+
+def _cache_file(setting_file: str, content: bytes) -> str:
+    """
+    The compiled settings are cached in the __pycache__ next to the settings file,
+    keyed by the hash of the file content.
+    """
+    digest = hashlib.sha256(content + b"\0" + str(CACHE_VERSION).encode()).hexdigest()[:32]
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(setting_file)), "__pycache__")
+    return os.path.join(cache_dir, f"settings.{digest}.pickle")
+
+
+def dump_state() -> bytes:
+    """
+    Pickle the loaded settings (the global variables), before any schedule. It is the
+    content of the cache, and lets a long running process reset the model quickly.
+    """
+    state = {
+        "weekdays": len(modules.WEEKDAYS),
+        "depth": course_schedule_depth,
+        "course_table": COURSE_TABLE,
+        "course_hours": COURSE_HOURS,
+        "classes": ALL_CLASSES,
+        "teachers": ALL_TEACHERS,
+        "courses": ALL_COURSES,
+        "course_names": course_name_list,
+        "course_probability": course_probability,
+        "advance_courses": advance_decision_courses,
+        "advance_classes": advance_decision_classes,
+        "registry": modules.REGISTRY,
+    }
+    return pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_state(state_bytes: bytes) -> None:
+    """
+    Replace the global variables by the result of `dump_state()`.
+    """
+    global COURSE_TABLE, COURSE_HOURS, course_schedule_depth
+    state = pickle.loads(state_bytes)
+
+    _reset()
+    course_schedule_depth = state["depth"]
+    modules.set_weekdays(state["weekdays"])
+    modules.init_course_times(course_schedule_depth)
+    COURSE_TABLE = state["course_table"]
+    COURSE_HOURS = state["course_hours"]
+    # Fill in place, as other modules may keep the global containers.
+    ALL_CLASSES.update(state["classes"])
+    ALL_TEACHERS.update(state["teachers"])
+    ALL_COURSES.update(state["courses"])
+    course_name_list.extend(state["course_names"])
+    course_probability.update(state["course_probability"])
+    advance_decision_courses.extend(state["advance_courses"])
+    advance_decision_classes.extend(state["advance_classes"])
+    modules.set_registry(state["registry"])
+    initialize()
+
+
+def initialize() -> None:
+    """
+    Initialize the modules with the loaded models, and compute their availability with
+    the advance decisions. Call it again after the models are changed.
+    """
+    pinned = [
+        (course_time, course, target_classes)
+        for target_classes in advance_decision_classes
+        for course_time, course in advance_decision_courses
+    ]
+    modules.initialize(ALL_COURSES, ALL_TEACHERS, ALL_CLASSES, COURSE_TABLE, pinned)
+
+
+def _reset() -> None:
+    modules.new_registry()
+    ALL_CLASSES.clear()
+    ALL_TEACHERS.clear()
+    ALL_COURSES.clear()
+    course_name_list.clear()
+    course_probability.clear()
+    advance_decision_courses.clear()
+    advance_decision_classes.clear()
+
+
+def _write_file(filename: str, content: bytes) -> None:
+    # Write to a temporary file first, so other processes never read half a file.
+    temp_file = f"{filename}.{os.getpid()}.tmp"
+    with open(temp_file, "wb") as f:
+        f.write(content)
+    os.replace(temp_file, filename)
+
+
+def _dump_cache(cache_file: str) -> None:
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        _write_file(cache_file, dump_state())
+    except OSError:
+        pass
+
+
+def _load_cache(cache_file: str) -> bool:
+    """
+    Fill the global variables from the compiled settings.
+    :return: False if there is no usable cache
+    """
+    try:
+        with open(cache_file, "rb") as f:
+            load_state(f.read())
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, ValueError, KeyError):
+        _reset()
+        return False
+    return True
+
 
-def load():
+def load(setting_file: str = None, use_cache: bool = True):
     """_summary_
     A function to load the setting file and initialize the global variables.
+    Calling it again reloads everything, so the busy state of the last schedule is dropped.
+    :param setting_file: The settings file, default to SETTING_FILE
+    :param use_cache: Load the compiled settings from the cache if the file is not changed,
+        see `_cache_file()`
     """
     global COURSE_TABLE, ALL_CLASSES, ALL_TEACHERS, COURSE_HOURS, course_schedule_depth
 
-    # Write something.
-
-    with open(SETTING_FILE, "r", encoding="utf-8") as f:
-        data = yaml.safe_load(f)
-
-        course_info = data.get("courses")
-        course_schedule_: dict = data.get("course_schedule")
-        course_schedule_depth = len(course_schedule_)
-
-        # Load course names and probabilities
-        for course_name in course_info:
-            course_name_list.append(course_name)
-
-        for course in course_schedule_:
-            for course_num, course_details in course.items():
-                course_probability[course_num] = course_details.get("probability")
-
-        # Load classes, teachers, and courses
-        cls = data.get("classes")
-        tea = data.get("teachers")
-        cou = data.get("courses")
-        elective_cou = data.get("elective_courses")
-
-        # general courses
-        for j in cou:
-            for k, v in j.items():
-                max_daily_courses = v.get("max_daily_courses")
-                if max_daily_courses < 0:
-                    raise ValueError(
-                        "The max_daily_courses must be greater than or equal to 0!"
-                    )
-                cou_ = modules.Course(k, v.get("mode"), v.get("prohibit"))
-                cou_.daily_max_courses = max_daily_courses
-                ALL_COURSES[k] = cou_
-
-        # elective courses
-        elective_courses_relations_dict: dict[str, list[tuple[int, str]]] = {}
-        for j in elective_cou:
-            for k, v in j.items():
-                max_daily_courses = v.get("max_daily_courses")
-                relation_classes_num = v.get("relation_classes")
-                teacher_name = v.get("teacher_name")
-                for num in relation_classes_num:
-                    if elective_courses_relations_dict.get(k, False):
-                        elective_courses_relations_dict[k].append((num, teacher_name))
-                    else:
-                        elective_courses_relations_dict[k] = [(num, teacher_name)]
-
-                if max_daily_courses < 0:
-                    raise ValueError(
-                        "The max_daily_courses must be greater or equal to 0!"
-                    )
-                cou_ = modules.Course(k, 4, v.get("prohibit"))
-                cou_.daily_max_courses = max_daily_courses
-                ALL_COURSES[k] = cou_
-
-        for j in tea:
-            tea_ = modules.Teacher(teacher_name := j.get("name"))
-            unwilling = j.get("unwilling", None)
-            if unwilling:
-                tea_.add_unwilling(unwilling)
-            tea_.courses.append(j.get("course")[0])
-            ALL_TEACHERS[teacher_name] = tea_
-
-        for j in cls:
-            for k, v in j.items():
-                _class_course_dict_str_to_str = v.get("teachers")  # course: name
-
-            # Data preprocessing
-            class_course_dict: dict[modules.Course, modules.Teacher] = {}
-            if _class_course_dict_str_to_str is None:
+    if setting_file is None:
+        setting_file = SETTING_FILE
+
+    # Reset the global variables
+    _reset()
+
+    with open(setting_file, "rb") as f:
+        content = f.read()
+    cache_file = _cache_file(setting_file, content) if use_cache else None
+    if cache_file is not None and _load_cache(cache_file):
+        return
+
+    import yaml
+    data = yaml.load(content, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+
+    course_info = data.get("courses")
+    course_schedule_: dict = data.get("course_schedule")
+    course_schedule_depth = len(course_schedule_)
+    modules.set_weekdays(data.get("weekdays", modules.DEFAULT_WEEKDAYS))
+    modules.init_course_times(course_schedule_depth)
+
+    # Load course names and probabilities
+    for course_name in course_info:
+        course_name_list.append(course_name)
+
+    for course in course_schedule_:
+        for course_num, course_details in course.items():
+            course_probability[course_num] = course_details.get("probability")
+
+    # Load classes, teachers, and courses
+    cls = data.get("classes")
+    tea = data.get("teachers")
+    cou = data.get("courses")
+    elective_cou = data.get("elective_courses")
+
+    # general courses
+    for j in cou:
+        for k, v in j.items():
+            max_daily_courses = v.get("max_daily_courses")
+            if max_daily_courses < 0:
                 raise ValueError(
-                    "You must fill the class course info in 'settings.yaml'"
+                    "The max_daily_courses must be greater than or equal to 0!"
                 )
-            for (
-                _class_course_name,
-                _class_teacher_name,
-            ) in _class_course_dict_str_to_str.items():
-                cur_course = ALL_COURSES[_class_course_name]
-                cur_teacher = ALL_TEACHERS[_class_teacher_name]
-                class_course_dict[cur_course] = cur_teacher
-
-            cls_ = modules.Class(str(k), v.get("mode"))
-            cls_.add_course(class_course_dict)
-            for _course, _teacher in class_course_dict.items():
-                cls_.add_teacher(_teacher, _course)
-            ALL_CLASSES[cls_.class_num] = cls_
-
-        # transform 'elective_courses_relations_dict' dict value into class obj
-        elective_courses_relations: dict[modules.Course, list[modules.Class]] = {}
-        for course_name, infos in elective_courses_relations_dict.items():
-            for cur_class, teacher_name in infos:
-                class_obj = ALL_CLASSES[str(cur_class)]
-                course_obj_ = ALL_COURSES[course_name]
-                class_obj.add_teacher(ALL_TEACHERS.get(teacher_name))
-                if elective_courses_relations_dict.get(ALL_COURSES[course_name], False):
-                    elective_courses_relations[course_obj_].append(class_obj)
+            cou_ = modules.Course(k, v.get("mode"), v.get("prohibit"))
+            cou_.daily_max_courses = max_daily_courses
+            ALL_COURSES[k] = cou_
+
+    # elective courses
+    elective_courses_relations_dict: dict[str, list[tuple[int, str]]] = {}
+    for j in elective_cou:
+        for k, v in j.items():
+            max_daily_courses = v.get("max_daily_courses")
+            relation_classes_num = v.get("relation_classes")
+            teacher_name = v.get("teacher_name")
+            for num in relation_classes_num:
+                if elective_courses_relations_dict.get(k, False):
+                    elective_courses_relations_dict[k].append((num, teacher_name))
                 else:
-                    elective_courses_relations[course_obj_] = [class_obj]
-
-        # Load to course table
-        COURSE_HOURS = data.get("course_hours")
-
-        # Load 'advance_decision' courses
-        # Then delete them from 'COURSE_HOURS'
-        advance_decision_courses_from_data = data.get("advance_decision")
-        # advance_decision_courses
-        for course_info_dict in advance_decision_courses_from_data:
-            course_info_dict: dict
-            for key, value in course_info_dict.items():
-                course_name = key
-                target_class_str_list = value.get("target_class")
-                target_class_obj_list: list[modules.Class] = []
-                for target_class_str in target_class_str_list:
-                    target_class_obj_list.append(ALL_CLASSES[str(target_class_str)])
-                time_info = value.get("time")
-                time_day = time_info.get("day")
-                time_course = time_info.get("course_time")
-                # Transform time_day and time_course into CourseTime obj
-                time_obj = modules.CourseTime(time_day, time_course)
-                # Add to advance_decision_courses
-                advance_decision_courses.append(
-                    (time_obj, ALL_COURSES.get(course_name))
-                )
-                # Add to advance_decision_classes
-                for target_class_num in value["target_class"]:
-                    try:
-                        advance_decision_classes[
-                            len(advance_decision_classes) - 1
-                        ].append(ALL_CLASSES[str(target_class_num)])
-                    except IndexError:
-                        advance_decision_classes.append([])
-                        advance_decision_classes[
-                            len(advance_decision_classes) - 1
-                        ].append(ALL_CLASSES[str(target_class_num)])
-                # Minus the number from COURSE_HOURS. (Include arts and science class type)
-                for course_type in COURSE_HOURS:
-                    for course_name_dict in COURSE_HOURS[course_type]:
-                        if course_name_dict.get(course_name, False):
-                            course_name_dict[course_name] -= 1
-                            if course_name_dict[course_name] < 0:
-                                raise ValueError(
-                                    f"The course '{course_name}' is not enough!\n"
-                                    "You had better check the 'advance_decision' in 'settings.yaml'"
-                                )
-
-        COURSE_TABLE = modules.CourseTable(course_schedule_depth, course_probability)
-        for j in range(1, COURSE_TABLE.course_depth + 1):
-            COURSE_TABLE.append_course()
-        modules.initialize(ALL_COURSES, ALL_TEACHERS, ALL_CLASSES, COURSE_TABLE)
-
+                    elective_courses_relations_dict[k] = [(num, teacher_name)]
 
-if __name__ == "__main__":
-    load()
+            if max_daily_courses < 0:
+                raise ValueError(
+                    "The max_daily_courses must be greater or equal to 0!"
+                )
+            cou_ = modules.Course(k, 4, v.get("prohibit"))
+            cou_.daily_max_courses = max_daily_courses
+            ALL_COURSES[k] = cou_
+
+    for j in tea:
+        tea_ = modules.Teacher(teacher_name := j.get("name"))
+        unwilling = j.get("unwilling", None)
+        if unwilling:
+            tea_.add_unwilling(unwilling)
+        tea_.courses.append(j.get("course")[0])
+        ALL_TEACHERS[teacher_name] = tea_
+
+    for j in cls:
+        for k, v in j.items():
+            _class_course_dict_str_to_str = v.get("teachers")  # course: name
+
+        # Data preprocessing
+        class_course_dict: dict[modules.Course, modules.Teacher] = {}
+        if _class_course_dict_str_to_str is None:
+            raise ValueError(
+                "You must fill the class course info in 'settings.yaml'"
+            )
+        for (
+            _class_course_name,
+            _class_teacher_name,
+        ) in _class_course_dict_str_to_str.items():
+            cur_course = ALL_COURSES[_class_course_name]
+            cur_teacher = ALL_TEACHERS[_class_teacher_name]
+            class_course_dict[cur_course] = cur_teacher
+
+        cls_ = modules.Class(str(k), v.get("mode"))
+        cls_.add_course(class_course_dict)
+        for _course, _teacher in class_course_dict.items():
+            cls_.add_teacher(_teacher, _course)
+        ALL_CLASSES[cls_.class_num] = cls_
+
+    # transform 'elective_courses_relations_dict' dict value into class obj
+    elective_courses_relations: dict[modules.Course, list[modules.Class]] = {}
+    for course_name, infos in elective_courses_relations_dict.items():
+        for cur_class, teacher_name in infos:
+            class_obj = ALL_CLASSES[str(cur_class)]
+            course_obj_ = ALL_COURSES[course_name]
+            class_obj.add_teacher(ALL_TEACHERS.get(teacher_name))
+            if elective_courses_relations_dict.get(ALL_COURSES[course_name], False):
+                elective_courses_relations[course_obj_].append(class_obj)
+            else:
+                elective_courses_relations[course_obj_] = [class_obj]
+
+    # Load to course table
+    COURSE_HOURS = data.get("course_hours")
+
+    # Load 'advance_decision' courses
+    # Then delete them from 'COURSE_HOURS'
+    advance_decision_courses_from_data = data.get("advance_decision")
+    # advance_decision_courses
+    for course_info_dict in advance_decision_courses_from_data:
+        course_info_dict: dict
+        for key, value in course_info_dict.items():
+            course_name = key
+            target_class_str_list = value.get("target_class")
+            target_class_obj_list: list[modules.Class] = []
+            for target_class_str in target_class_str_list:
+                target_class_obj_list.append(ALL_CLASSES[str(target_class_str)])
+            time_info = value.get("time")
+            time_day = time_info.get("day")
+            time_course = time_info.get("course_time")
+            # Transform time_day and time_course into CourseTime obj
+            time_obj = modules.CourseTime(time_day, time_course)
+            # Add to advance_decision_courses
+            advance_decision_courses.append(
+                (time_obj, ALL_COURSES.get(course_name))
+            )
+            # Add to advance_decision_classes
+            for target_class_num in value["target_class"]:
+                try:
+                    advance_decision_classes[
+                        len(advance_decision_classes) - 1
+                    ].append(ALL_CLASSES[str(target_class_num)])
+                except IndexError:
+                    advance_decision_classes.append([])
+                    advance_decision_classes[
+                        len(advance_decision_classes) - 1
+                    ].append(ALL_CLASSES[str(target_class_num)])
+            # Minus the number from COURSE_HOURS. (Include arts and science class type)
+            for course_type in COURSE_HOURS:
+                for course_name_dict in COURSE_HOURS[course_type]:
+                    if course_name_dict.get(course_name, False):
+                        course_name_dict[course_name] -= 1
+                        if course_name_dict[course_name] < 0:
+                            raise ValueError(
+                                f"The course '{course_name}' is not enough!\n"
+                                "You had better check the 'advance_decision' in 'settings.yaml'"
+                            )
+
+    COURSE_TABLE = modules.CourseTable(course_schedule_depth, course_probability)
+    for j in range(1, COURSE_TABLE.course_depth + 1):
+        COURSE_TABLE.append_course()
+    initialize()
+
+    if cache_file is not None:
+        _dump_cache(cache_file)
+
+
+def build_courses_list(course_type: str = "文科") -> list[modules.Course]:
+    """
+    Load courses based on course hours. Each course is repeated by its hours.
+    :param course_type: The key of 'course_hours' in settings.yaml
+    """
     courses_list = []
-
-    # Load courses based on course hours
-    subjects = COURSE_HOURS.get("文科")
+    subjects = COURSE_HOURS.get(course_type)
     for subject in subjects:
         for subject_name, course_hours in subject.items():
             course_obj = ALL_COURSES.get(subject_name)
@@ -213,48 +370,302 @@ if __name__ == "__main__":
                 raise ValueError(f"Course '{subject_name}' not found in ALL_COURSES!")
             for _ in range(course_hours):
                 courses_list.append(course_obj)
+    return courses_list
+
+
+def checkpoint_key(setting_file: str = None, engine: str = "random", **schedule_kwargs) -> str:
+    """
+    The key of the checkpoints of a run: the settings file content, the engine and its
+    arguments, except the generator which the checkpoint holds and the seed which
+    `load_checkpoint()` checks by itself.
+    """
+    with open(setting_file or SETTING_FILE, "rb") as f:
+        content = f.read()
+    arguments = {
+        key: value for key, value in schedule_kwargs.items()
+        if key not in ("seed", "rng", "stats", "checkpoint")
+    }
+    arguments["engine"] = engine
+    digest = hashlib.sha256(content)
+    digest.update(json.dumps(arguments, sort_keys=True, default=str).encode())
+    digest.update(str(CACHE_VERSION).encode())
+    return digest.hexdigest()[:32]
+
+
+def save_checkpoint(filename: str, key: str, seed: int = None) -> Callable[[dict], None]:
+    """
+    :param seed: The seed of the run, checked by `load_checkpoint()`
+    :return: The `checkpoint` argument of `data_processing.Schedule`, which writes
+        each state to `filename` with `key`
+    """
+    def save(state: dict) -> None:
+        _write_file(
+            filename,
+            pickle.dumps({"key": key, "seed": seed, **state}, protocol=pickle.HIGHEST_PROTOCOL),
+        )
+    return save
+
+
+def load_checkpoint(filename: str, key: str, seed: int = None) -> dict:
+    """
+    Read the last state written by `save_checkpoint()`.
+    :param seed: The seed of the run to continue, which must be the seed of the checkpoint
+    :raise ValueError: If the checkpoint is broken or of another run, see `checkpoint_key()`,
+        or of another seed
+    """
+    with open(filename, "rb") as f:
+        try:
+            state = pickle.load(f)
+        except Exception as e:  # Any foreign file may fail to unpickle in any way.
+            raise ValueError(f"The checkpoint '{filename}' is broken: {e}") from None
+    if not isinstance(state, dict) or state.get("key") != key:
+        raise ValueError(
+            f"The checkpoint '{filename}' is of other settings or schedule arguments!"
+        )
+    if state.get("seed") != seed:
+        raise ValueError(
+            f"The checkpoint '{filename}' is of seed {state.get('seed')}, not {seed}!"
+        )
+    return state
+
+
+def schedule_loaded(
+    engine: str = "random", resume: dict = None, class_nums: list[str] = None, **schedule_kwargs
+) -> data_processing.Schedule:
+    """
+    Run the engine once on the loaded settings.
+    :param resume: Continue from this state, see `load_checkpoint()`
+    :param class_nums: Schedule only these classes (and their advance decisions),
+        default to all the classes
+    :return: The engine after schedule
+    """
+    courses_list = build_courses_list()
 
     # course schedule beginning
-    course_schedule = data_processing.Schedule(
-        ALL_COURSES, ALL_TEACHERS, ALL_CLASSES, COURSE_TABLE
+    course_schedule = ENGINES[engine](
+        ALL_COURSES, ALL_TEACHERS, ALL_CLASSES, COURSE_TABLE, **schedule_kwargs
     )
 
     # Replace the 'class_list' to each from 'ALL_CLASSES'
     classes_list: list[modules.Class] = []
     for class_obj in ALL_CLASSES.values():
-        classes_list.append(class_obj)
+        if class_nums is None or class_obj.class_num in class_nums:
+            classes_list.append(class_obj)
 
     # TODO: Schedule advanced decision courses.
     # Foreach target classes
     for target_classes in advance_decision_classes:
+        if class_nums is not None:
+            target_classes = [each_class for each_class in target_classes if each_class.class_num in class_nums]
+            if not target_classes:
+                continue
         course_schedule.advance_schedule(
             advance_decision_courses, target_classes
         )
+    if resume is not None:
+        course_schedule.resume(resume)
 
     # Schedule.
-    after_schedule_classes = course_schedule(classes_list, courses_list)
+    course_schedule(classes_list, courses_list)
+    return course_schedule
+
+
+def run_schedule(
+    setting_file: str = None,
+    engine: str = "random",
+    use_cache: bool = True,
+    checkpoint: str = None,
+    resume: bool = False,
+    **schedule_kwargs,
+) -> dict[str, modules.Class]:
+    """
+    Load the settings and schedule all the classes once.
+    :param setting_file: The settings file, default to SETTING_FILE
+    :param engine: A key of ENGINES
+    :param use_cache: Passed to `load()`
+    :param checkpoint: Write a checkpoint to this file after the elective courses and
+        after each class, see `save_checkpoint()`
+    :param resume: Continue from `checkpoint` if it exists, the result is the same as
+        the run which wrote it would have been
+    :param schedule_kwargs: Passed to the engine (see `data_processing.Schedule`), such as seed
+    :return: ALL_CLASSES after schedule
+    :raise ValueError: If the checkpoint to resume is of another run or seed
+    """
+    load(setting_file, use_cache)
+    if checkpoint is None:
+        return schedule_loaded(engine, **schedule_kwargs).ALL_CLASSES
+
+    key = checkpoint_key(setting_file, engine, **schedule_kwargs)
+    seed = schedule_kwargs.get("seed")
+    state = None
+    if resume and os.path.exists(checkpoint):
+        state = load_checkpoint(checkpoint, key, seed)
+    return schedule_loaded(
+        engine, resume=state, checkpoint=save_checkpoint(checkpoint, key, seed), **schedule_kwargs
+    ).ALL_CLASSES
+
+
+def run_schedule_anytime(
+    time_budget: float,
+    setting_file: str = None,
+    engine: str = "random",
+    use_cache: bool = True,
+    seed: int | np.random.SeedSequence = None,
+    reload: Callable[[], None] = None,
+    **schedule_kwargs,
+) -> tuple[dict[str, modules.Class], dict]:
+    """
+    Schedule until a complete timetable is found or `time_budget` seconds run out, and
+    keep the timetable with the fewest unfilled course times. It never raises for an
+    infeasible setting, the unfilled course times are reported instead.
+    The random engine restarts with the next draws of one generator seeded by `seed`,
+    so the first attempt is the same as `run_schedule()` with the seed. A deterministic
+    engine runs once.
+    :param reload: Reset the model before each attempt, default to `load(setting_file)`
+    :return: (ALL_CLASSES holding the best timetable, report), the report is
+        `Schedule.report()` of the best attempt with "attempts" and the total "elapsed"
+    """
+    start = time_.perf_counter()
+    deadline = start + time_budget
+    rng = np.random.default_rng(seed)
+    if reload is None:
+        def reload():
+            load(setting_file, use_cache)
+
+    best_timetable, best_report, best_attempt = None, None, -1
+    attempt = 0
+    while True:
+        reload()
+        course_schedule = schedule_loaded(
+            engine, rng=rng, time_budget=max(0.0, deadline - time_.perf_counter()), **schedule_kwargs
+        )
+        report = course_schedule.report()
+        if best_report is None or len(report["unfilled"]) < len(best_report["unfilled"]):
+            best_timetable, best_report, best_attempt = timetable_of(ALL_CLASSES), report, attempt
+        attempt += 1
+        if best_report["complete"] or course_schedule.deterministic or time_.perf_counter() >= deadline:
+            break
+
+    if best_attempt != attempt - 1:
+        reload()
+        apply_timetable(best_timetable)
+    best_report["attempts"] = attempt
+    best_report["elapsed"] = time_.perf_counter() - start
+    return ALL_CLASSES, best_report
+
+
+def timetable_of(all_classes: dict[str, modules.Class]) -> dict[str, list[tuple[int, int, str]]]:
+    """
+    Transform the decided courses of each class into plain data, which can be pickled
+    or dumped as json.
+    :return: {class_num: [(day, course_time, course_name), ...]} ordered by time
+    """
+    timetable = {}
+    for class_num, class_obj in all_classes.items():
+        # The decided courses are already ordered by time, see `modules.CourseRow`.
+        timetable[class_num] = [
+            (course_time.day, course_time.course_time, course.name)
+            for course_time, course in class_obj.decided_courses.items()
+        ]
+    return timetable
 
-    # Transform dict to list
-    after_schedule_classes = utils.dict_to_tuple_list(after_schedule_classes)
-    after_schedule_classes: list[tuple[modules.CourseTime, modules.Class]]
 
-    # Sort the list by time.
-    for _, class_obj in after_schedule_classes:
-        class_obj: modules.Class
-        # transform decided_courses dict to list
-        class_obj.decided_courses = utils.dict_to_tuple_list(class_obj.decided_courses)
+def apply_timetable(timetable: dict[str, list[tuple[int, int, str]]]) -> dict[str, modules.Class]:
+    """
+    Put a timetable from `timetable_of()` into the loaded classes and teachers.
+    :return: ALL_CLASSES
+    """
+    for class_num, decided_courses in timetable.items():
+        class_obj = ALL_CLASSES[str(class_num)]
+        for day, course_time, course_name in decided_courses:
+            time_obj = modules.CourseTime(day, course_time)
+            course_obj = ALL_COURSES[course_name]
+            class_obj.add_decided_course([(time_obj, course_obj)])
+            # The teacher of an elective course is busy once for all its classes.
+            teacher = class_obj.teachers.get(course_name)
+            if teacher is not None and not teacher.cheek_busy_courses(time_obj):
+                teacher.add_busy_course(course_obj, time_obj)
+    return ALL_CLASSES
 
-        class_obj.decided_courses.sort(key=cmp_to_key(utils.decided_courses_cmp))
 
-    # output
-    for class_num, class_obj in after_schedule_classes:
-        decided_courses: dict[
-            modules.CourseTime, modules.Course
-        ] = class_obj.decided_courses
+if __name__ == "__main__":
+    # The modules only used by the command line are imported here, see the README.
+    import argparse
+
+    import export
+
+    parser = argparse.ArgumentParser(description="Schedule courses based on settings.")
+    parser.add_argument("--settings", default=SETTING_FILE)
+    parser.add_argument("--output", default="CourseScheduleOutput.csv")
+    parser.add_argument("--encoding", choices=export.ENCODINGS, default="gbk", help="The encoding of the csv file")
+    parser.add_argument("--teacher-output", default=None, help="Also export the timetable of each teacher")
+    parser.add_argument("--course-output", default=None, help="Also export the classes of each course")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="random")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--selection", choices=["masked", "rejection"], default="masked")
+    parser.add_argument("--stats", default=None, help="Dump the schedule statistics as json to this file")
+    parser.add_argument(
+        "--time-budget", type=float, default=None, metavar="SECONDS",
+        help="Stop after this many seconds and keep the best timetable found, maybe partial",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the compiled settings cache")
+    parser.add_argument(
+        "--checkpoint", default=None, metavar="FILE",
+        help="Save the progress to this file after each class",
+    )
+    parser.add_argument(
+        "--resume", action="store_true", help="Continue from the --checkpoint file if it exists",
+    )
+    parser.add_argument(
+        "--optimize", type=float, default=0, metavar="SECONDS",
+        help="Improve the timetable by local search for this many seconds",
+    )
+    args = parser.parse_args()
+    if args.resume and args.checkpoint is None:
+        parser.error("--resume requires --checkpoint")
+    if args.checkpoint is not None and args.time_budget is not None:
+        parser.error("--checkpoint can not be used with --time-budget")
+
+    schedule_stats = None
+    if args.stats:
+        import instrument
+        schedule_stats = instrument.ScheduleStats()
+    if args.time_budget is None:
+        after_schedule_classes = run_schedule(
+            args.settings, args.engine, not args.no_cache, args.checkpoint, args.resume,
+            seed=args.seed, selection=args.selection, stats=schedule_stats,
+        )
+    else:
+        after_schedule_classes, schedule_report = run_schedule_anytime(
+            args.time_budget, args.settings, args.engine, not args.no_cache, seed=args.seed,
+            selection=args.selection, stats=schedule_stats,
+        )
+        print(json.dumps(schedule_report, ensure_ascii=False))
+    if schedule_stats is not None:
+        schedule_stats.dump(args.stats)
+
+    if args.optimize > 0:
+        import optimize
+        import probability
+
+        local_search = optimize.LocalSearch(
+            after_schedule_classes,
+            probability.ProbabilityTable(course_probability, course_schedule_depth),
+            seed=args.seed,
+        )
+        print(local_search(args.optimize))
+
+    # output, the decided courses of each class are ordered by time
+    for class_num, class_obj in after_schedule_classes.items():
+        decided_courses: modules.CourseRow = class_obj.decided_courses
         print(class_num)
-        for time, course in decided_courses:
+        for time, course in decided_courses.items():
             print(f"{time}: {course.name}")
         print("=" * 25)
 
     # Export to csv file.
-    export.export_data(after_schedule_classes, "CourseScheduleOutput.csv")
+    export.export_data(after_schedule_classes.items(), args.output, args.encoding)
+    if args.teacher_output:
+        export.export_teacher_data(ALL_TEACHERS, args.teacher_output, args.encoding)
+    if args.course_output:
+        export.export_course_data(ALL_COURSES, args.course_output, args.encoding)
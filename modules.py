@@ -4,9 +4,12 @@ Created on Mon Jul 22 14:
 """
 
 import copy
+from collections.abc import Mapping
 
-WEEKDAYS = [i for i in range(1, 12 + 1)]
-MAP = [[None for j in range(1005)] for i in range(1005)]
+import numpy as np
+
+DEFAULT_WEEKDAYS = 12
+WEEKDAYS = [i for i in range(1, DEFAULT_WEEKDAYS + 1)]
 
 
 class Course:
@@ -14,13 +17,19 @@ class Course:
     Course class.
     """
 
+    __slots__ = (
+        "id", "name", "mode", "prohibit", "teachers", "daily_max_courses",
+        "elective_relation_classes", "classes_at",
+    )
+
     def __init__(self, name, mode: int, prohibit: list[int] | list = None):
+        # Dense id in the current Registry, see `new_registry()`.
+        self.id: int = REGISTRY.add_course(self)
         self.name = name
         # 基础科目配置(其中mode=0为必修,mode=1为物理或历史,mode=2为选课,mode=3为副科, mode=4是走班(对于理科mode=1, 见classes))
         # mode=5 是特殊课程(such as 升旗), 需要手动安排课程(如单周一第一节 100% 为升旗)
         self.mode = mode
-        if prohibit is not None:
-            self.prohibit = prohibit
+        self.prohibit = prohibit if prohibit is not None else []
         self.teachers = []
 
         self.daily_max_courses: int = -1
@@ -28,6 +37,9 @@ class Course:
         # elective_course var
         self.elective_relation_classes: list[Course] = []
 
+        # Inverted index kept by Class: the classes which have this course at each time.
+        self.classes_at: dict[CourseTime, list] = {}
+
     def add_teacher(self, teacher):
         self.teachers.append(teacher)
 
@@ -44,9 +56,6 @@ class Course:
             for relation_class in relation_classes:
                 self.elective_relation_classes.append(relation_class)
 
-    def __hash__(self):
-        return hash(hash(self.name) + hash(self.mode))
-
     def __str__(self):
         return f"<Course name={self.name}>"
 
@@ -73,50 +82,66 @@ class CourseTable(object):
 class CourseTime(object):
     """
     用于记录课程的具体时间
+
+    Every course time is interned: `CourseTime(day, course_time)` returns the
+    preallocated instance built by `init_course_times()`, so equality, hashing
+    and ordering are plain integer operations on `id`.
     """
 
-    def __init__(
-        self,
+    __slots__ = ("id", "day", "course_time", "bit")
+
+    def __new__(
+        cls,
         day: int,
         course_time: int,
         week_days: list = None,
         max_courses: int = None,
     ):
-        if week_days is None:
-            week_days = WEEKDAYS
-        if max_courses is not None:
-            max_courses = COURSE_TABLE.course_depth
-
-        self.week_days = week_days
-        self.max_courses = max_courses
-
-        self.day = day
-        self.course_time = course_time
+        if not COURSE_TIMES:
+            raise ValueError("Call 'init_course_times()' before creating CourseTime!")
+        if not (1 <= day <= len(COURSE_TIMES) // COURSE_DEPTH
+                and 1 <= course_time <= COURSE_DEPTH):
+            raise ValueError(f"Unexpected course time day={day} course_time={course_time}")
+        return COURSE_TIMES[(day - 1) * COURSE_DEPTH + course_time - 1]
+
+    @classmethod
+    def _allocate(cls, day: int, course_time: int, depth: int):
+        obj = object.__new__(cls)
+        obj.day = day
+        obj.course_time = course_time
+        # Dense slot id: day * depth + period (both counted from zero)
+        obj.id = (day - 1) * depth + course_time - 1
+        # The bit of this course time in a slot occupancy mask.
+        obj.bit = 1 << obj.id
+        return obj
 
     def __eq__(self, other) -> bool:
         if isinstance(other, CourseTime):
-            return self.day == other.day and self.course_time == other.course_time
+            return self.id == other.id
         else:
             raise TypeError(f"Unexpected type {type(other)}")
 
-    def __le__(self, other) -> bool:
+    def __lt__(self, other) -> bool:
         if isinstance(other, CourseTime):
-            day = self.day * 1e5
-            course_time = self.course_time
-
-            other_day = other.day * 1e5
-            other_course_time = other.course_time
-
-            all_time = day + course_time
-            other_all_time = other_day + other_course_time
+            return self.id < other.id
+        else:
+            raise TypeError(f"Unexpected type {type(other)}.")
 
-            return all_time <= other_all_time
+    def __le__(self, other) -> bool:
+        if isinstance(other, CourseTime):
+            return self.id <= other.id
         else:
             raise TypeError(f"Unexpected type {type(other)}.")
 
     def __gt__(self, other) -> bool:
         if isinstance(other, CourseTime):
-            return not (self.__eq__(other) or self.__le__(other))
+            return self.id > other.id
+        else:
+            raise TypeError(f"Unexpected type {type(other)}")
+
+    def __ge__(self, other) -> bool:
+        if isinstance(other, CourseTime):
+            return self.id >= other.id
         else:
             raise TypeError(f"Unexpected type {type(other)}")
 
@@ -127,16 +152,74 @@ class CourseTime(object):
         return self.__str__()
 
     def __hash__(self):
-        return hash((self.day, self.course_time))
+        return self.id
+
+    def __reduce__(self):
+        # Carry the size of the table, so a pickle can be loaded in a new process.
+        return _unpickle_course_time, (self.day, self.course_time, COURSE_DEPTH, len(COURSE_TIMES) // COURSE_DEPTH)
+
+
+def set_weekdays(days: int) -> list[int]:
+    """
+    Set the number of days of a (big) week. WEEKDAYS is changed in place, so the
+    modules which imported it see the new days.
+    """
+    if days <= 0:
+        raise ValueError("The weekdays must be greater than 0!")
+    WEEKDAYS[:] = range(1, days + 1)
+    return WEEKDAYS
+
+
+# Interned course times, indexed by 'CourseTime.id'.
+COURSE_DEPTH: int = 0
+COURSE_TIMES: list[CourseTime] = []
+
+
+def init_course_times(depth: int, days: int = None) -> list[CourseTime]:
+    """
+    Preallocate one CourseTime for each (day, course_time) of a week.
+    :param depth: The number of courses in a day
+    :param days: The number of days, default to len(WEEKDAYS)
+    :return: All course times ordered by id
+    """
+    global COURSE_DEPTH
+    if days is None:
+        days = len(WEEKDAYS)
+    if COURSE_DEPTH == depth and len(COURSE_TIMES) == days * depth:
+        return COURSE_TIMES
+
+    COURSE_DEPTH = depth
+    COURSE_TIMES.clear()
+    for day in range(1, days + 1):
+        for course_time in range(1, depth + 1):
+            COURSE_TIMES.append(CourseTime._allocate(day, course_time, depth))
+    return COURSE_TIMES
+
+
+def _unpickle_course_time(day: int, course_time: int, depth: int, days: int) -> CourseTime:
+    if COURSE_DEPTH != depth or len(COURSE_TIMES) != depth * days:
+        set_weekdays(days)
+        init_course_times(depth)
+    return CourseTime(day, course_time)
 
 
 class Teacher(object):
+    __slots__ = ("id", "name", "courses", "unwilling", "store", "busy_mask", "lessons")
+
     def __init__(self, name):
+        # Dense id in the current Registry, also the row in the TimetableStore.
+        self.id: int = REGISTRY.add_teacher(self)
         self.name = name
         self.courses = []
         self.unwilling = []
 
-        self.busy_courses: dict[CourseTime, Course] = {}
+        # Set by `initialize()`.
+        self.store: TimetableStore | None = None
+        # Occupancy index of 'busy_courses', one bit per course time.
+        self.busy_mask: int = 0
+        # Inverted index kept by Class: the (class, course) taught at each time.
+        # An elective course has several classes at the same time.
+        self.lessons: dict[CourseTime, list[tuple]] = {}
 
     def add_unwilling(self, course_num: int | list[int]):
         if isinstance(course_num, int):
@@ -150,37 +233,61 @@ class Teacher(object):
     def add_course(self, course: Course):
         self.courses.append(course)
 
+    @property
+    def busy_courses(self) -> "CourseRow":
+        """
+        {course time: course} of the teacher, a view on the TimetableStore ordered by time.
+        """
+        return CourseRow(self.store.teacher_grid[self.id], self.store.registry.courses)
+
     def cheek_busy_courses(self, current_time: CourseTime) -> bool:
         """
         cheek func `add_busy_courses()` the added courses conflict to current_time
         :param current_time: The course time to be checked for
         :return: Return True if the course is conflict with `current_time`
         """
-        for course_time, _ in self.busy_courses.items():
-            if course_time == current_time:
-                return True
-        return False
+        return bool(self.busy_mask & current_time.bit)
 
     def add_busy_course(self, course: Course, time: CourseTime):
         # cheek if arg 'time' already present in 'self.busy_courses'
         if self.cheek_busy_courses(time):
             raise ValueError("The argument: time is already in self.busy_courses!")
         # self.busy_courses.append((course, time))
-        self.busy_courses[time] = course
+        self.store.teacher_grid[self.id, time.id] = course.id
+        self.busy_mask |= time.bit
+
+    def remove_busy_course(self, time: CourseTime) -> Course:
+        """
+        Free the teacher at `time`, the reverse of `add_busy_course()`.
+        :return: The course which was taught at `time`
+        """
+        course_id = self.store.teacher_grid[self.id, time.id]
+        if course_id < 0:
+            raise KeyError(time)
+        self.store.teacher_grid[self.id, time.id] = -1
+        self.busy_mask &= ~time.bit
+        return self.store.registry.courses[course_id]
 
     def __str__(self):
         return f"<teacher={self.name} courses={self.courses}>"
 
 
 class Class(object):
+    __slots__ = ("id", "class_num", "course_mode", "courses", "teachers", "store", "decided_mask")
+
     def __init__(self, class_num, course_mode: int):
+        # Dense id in the current Registry, also the row in the TimetableStore.
+        self.id: int = REGISTRY.add_class(self)
         self.class_num = class_num
         self.course_mode = course_mode  # 0为文科, 1为理科
         self.courses = []
-        self.teachers: dict[Course, Teacher] = {}
+        self.teachers: dict[str, Teacher] = {}  # course name: teacher
 
-        # course schedule variables
-        self.decided_courses: dict[CourseTime, Course] = {}
+        # course schedule variables, kept in the row of this class in the TimetableStore
+        # (set by `initialize()`) with the daily number of each course.
+        self.store: TimetableStore | None = None
+        # Occupancy index of 'decided_courses', one bit per course time.
+        self.decided_mask: int = 0
 
     def add_course(self, course):
         self.courses.append(course)
@@ -208,6 +315,13 @@ class Class(object):
         # Set the teacher for the course
         self.teachers[teacher_course] = teacher
 
+    @property
+    def decided_courses(self) -> "CourseRow":
+        """
+        {course time: course} of the class, a view on the TimetableStore ordered by time.
+        """
+        return CourseRow(self.store.class_grid[self.id], self.store.registry.courses)
+
     def add_decided_course(
         self, decided_course: list[tuple[CourseTime, Course]],
         whether_check: bool = True
@@ -227,20 +341,287 @@ class Class(object):
         # TODO Remove this block is right?
         # if decided_course == []:
         #     raise ValueError("The decided course had not been sat!")
+        store = self.store
         for course_time, course in decided_course:
-            if whether_check and self.decided_courses.get(course_time, False):
+            if whether_check and self.cheek_decided_courses(course_time):
                 raise ValueError(
                     f"The course time {course_time} had been decided!"
                 )
-            self.decided_courses[course_time] = course
+            replaced_id = store.class_grid[self.id, course_time.id]
+            if replaced_id >= 0:
+                store.daily_counts[self.id, course_time.day - 1, replaced_id] -= 1
+                self._unindex_course(course_time, store.registry.courses[replaced_id])
+            store.class_grid[self.id, course_time.id] = course.id
+            self.decided_mask |= course_time.bit
+            store.daily_counts[self.id, course_time.day - 1, course.id] += 1
+            self._index_course(course_time, course)
+
+    def remove_decided_course(self, course_time: CourseTime) -> Course:
+        """
+        Remove a decided course from the schedule and roll back its counters.
+        :param course_time: The course time to be freed
+        :return: The removed course
+        """
+        store = self.store
+        course_id = store.class_grid[self.id, course_time.id]
+        if course_id < 0:
+            raise KeyError(course_time)
+        course = store.registry.courses[course_id]
+        store.class_grid[self.id, course_time.id] = -1
+        self.decided_mask &= ~course_time.bit
+        store.daily_counts[self.id, course_time.day - 1, course_id] -= 1
+        self._unindex_course(course_time, course)
+        return course
+
+    def _index_course(self, course_time: CourseTime, course: Course) -> None:
+        """
+        Record the decided course in `Course.classes_at` and its teacher's `Teacher.lessons`.
+        """
+        course.classes_at.setdefault(course_time, []).append(self)
+        teacher = self.teachers.get(course.name)
+        if teacher is not None:
+            teacher.lessons.setdefault(course_time, []).append((self, course))
+
+    def _unindex_course(self, course_time: CourseTime, course: Course) -> None:
+        classes = course.classes_at[course_time]
+        classes.remove(self)
+        if not classes:
+            del course.classes_at[course_time]
+        teacher = self.teachers.get(course.name)
+        if teacher is not None:
+            lessons = teacher.lessons[course_time]
+            lessons.remove((self, course))
+            if not lessons:
+                del teacher.lessons[course_time]
+
+    def daily_courses_num(self, day: int, course: Course) -> int:
+        """
+        The number of `course` which had been decided on `day`.
+        """
+        return int(self.store.daily_counts[self.id, day - 1, course.id])
+
+    def daily_courses_full(self, day: int, course: Course) -> bool:
+        """
+        Whether `course` can not be put on `day` any more by its daily max courses.
+        """
+        return self.daily_courses_num(day, course) > course.daily_max_courses
+
+    def available(self, course: Course) -> int:
+        """
+        The course times at which the class may have `course`, see
+        `TimetableStore.update_availability()`.
+        """
+        return self.store.class_available[self.id][course.id]
+
+    def daily_full_courses(self, day: int, courses: list[Course]) -> np.ndarray:
+        """
+        `daily_courses_full()` of each course at once.
+        :return: A bool array, True if the course can not be put on `day` any more
+        """
+        course_ids = [course.id for course in courses]
+        limits = np.array([course.daily_max_courses for course in courses])
+        return self.store.daily_counts[self.id, day - 1, course_ids] > limits
+
+    def cheek_decided_courses(self, current_time: CourseTime) -> bool:
+        """
+        Cheek whether `current_time` had been decided in this class.
+        :param current_time: The course time to be checked for
+        :return: Return True if the class is busy at `current_time`
+        """
+        return bool(self.decided_mask & current_time.bit)
 
     def __str__(self) -> str:
         return f"<Class num={self.class_num}>"
 
-    def __eq__(self, other) -> bool:
-        if isinstance(other, Class):
-            other: Class
-            return self.class_num == other.class_num
+
+class CourseRow(Mapping):
+    """
+    A read-only {course time: course} view on a row of the TimetableStore, iterated in
+    the order of the course times.
+    """
+
+    __slots__ = ("_row", "_courses")
+
+    def __init__(self, row: np.ndarray, courses: list[Course]):
+        self._row = row
+        self._courses = courses
+
+    def __getitem__(self, course_time: CourseTime) -> Course:
+        course_id = self._row[course_time.id]
+        if course_id < 0:
+            raise KeyError(course_time)
+        return self._courses[course_id]
+
+    def __iter__(self):
+        for time_id in np.flatnonzero(self._row >= 0).tolist():
+            yield COURSE_TIMES[time_id]
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._row >= 0))
+
+    def items(self) -> list[tuple[CourseTime, Course]]:
+        time_ids = np.flatnonzero(self._row >= 0)
+        return [
+            (COURSE_TIMES[time_id], self._courses[course_id])
+            for time_id, course_id in zip(time_ids.tolist(), self._row[time_ids].tolist())
+        ]
+
+    def values(self) -> list[Course]:
+        return [self._courses[course_id] for course_id in self._row[self._row >= 0].tolist()]
+
+
+class TimetableStore(object):
+    """
+    The timetable of all the classes and teachers of a Registry in dense integer arrays:
+        class_grid[class id, course time id] -> course id, -1 if free
+        teacher_grid[teacher id, course time id] -> course id, -1 if free
+        daily_counts[class id, day - 1, course id] -> number of the course on the day
+    `Class.decided_courses` and `Teacher.busy_courses` are views on the rows. A teacher
+    row holds the course, the classes of an elective course are in `Teacher.lessons`.
+    """
+
+    def __init__(self, registry: "Registry"):
+        self.registry = registry
+        self.slots = len(COURSE_TIMES)
+        self.days = self.slots // COURSE_DEPTH if COURSE_DEPTH else 0
+        self.class_grid = np.full((0, self.slots), -1, dtype=np.int16)
+        self.teacher_grid = np.full((0, self.slots), -1, dtype=np.int16)
+        self.daily_counts = np.zeros((0, self.days, 0), dtype=np.int16)
+        # Course time masks, see `update_availability()`
+        self.available: dict[tuple[int, int], int] = {}
+        self.class_available: list[list[int]] = []
+
+    def period_mask(self, course_nums) -> int:
+        """
+        The mask of the course times of the periods `course_nums` on every day.
+        """
+        mask = 0
+        for course_time in COURSE_TIMES:
+            if course_time.course_time in course_nums:
+                mask |= course_time.bit
+        return mask
+
+    def update_availability(self, pinned: list[tuple[CourseTime, Course, list["Class"]]] = ()) -> None:
+        """
+        Compute the course times at which each teacher may teach each course, once:
+            available[(course id, teacher id)]: all the course times, without the periods
+                of `Course.prohibit` and `Teacher.unwilling`, and the course times the
+                teacher is pinned to by an advance decision
+            class_available[class id][course id]: the mask of the teacher of the course
+                in the class, 0 if it has no teacher
+        So a feasibility check is `mask & course_time.bit`.
+        :param pinned: (course time, course, target classes) of each advance decision
+        """
+        registry = self.registry
+        pinned_masks: dict[int, int] = {}
+        for course_time, course, classes in pinned:
+            for class_obj in classes:
+                teacher = class_obj.teachers.get(course.name)
+                if teacher is not None:
+                    pinned_masks[teacher.id] = pinned_masks.get(teacher.id, 0) | course_time.bit
+
+        every = (1 << self.slots) - 1
+        period_masks: dict[frozenset, int] = {}
+        courses = {course.name: course for course in registry.courses}
+        self.available = {}
+        self.class_available = []
+        for class_obj in registry.classes:
+            class_available = [0] * len(registry.courses)
+            for course_name, teacher in class_obj.teachers.items():
+                course = courses.get(course_name)
+                if course is None or teacher is None:
+                    continue
+                key = (course.id, teacher.id)
+                if key not in self.available:
+                    periods = frozenset(course.prohibit) | frozenset(teacher.unwilling)
+                    if periods not in period_masks:
+                        period_masks[periods] = self.period_mask(periods)
+                    self.available[key] = every & ~period_masks[periods] & ~pinned_masks.get(teacher.id, 0)
+                class_available[course.id] = self.available[key]
+            self.class_available.append(class_available)
+
+    def full_days(self, classes: list["Class"], course: Course) -> np.ndarray:
+        """
+        Whether any of `classes` is full of `course` on each day, see `Class.daily_courses_full()`.
+        :return: A bool array of the days
+        """
+        counts = self.daily_counts[[class_obj.id for class_obj in classes], :, course.id]
+        return (counts > course.daily_max_courses).any(axis=0)
+
+    def attach(self) -> None:
+        """
+        Grow the arrays to all the models of the registry, the models registered since the
+        last call get empty rows.
+        """
+        registry = self.registry
+        classes, courses = len(registry.classes), len(registry.courses)
+        old_classes, _, old_courses = self.daily_counts.shape
+        if courses > old_courses:
+            self.daily_counts = np.concatenate((
+                self.daily_counts,
+                np.zeros((old_classes, self.days, courses - old_courses), dtype=np.int16),
+            ), axis=2)
+        if classes > old_classes:
+            self.class_grid = np.concatenate(
+                (self.class_grid, np.full((classes - old_classes, self.slots), -1, dtype=np.int16))
+            )
+            self.daily_counts = np.concatenate(
+                (self.daily_counts, np.zeros((classes - old_classes, self.days, courses), dtype=np.int16))
+            )
+        teachers = len(registry.teachers)
+        if teachers > len(self.teacher_grid):
+            self.teacher_grid = np.concatenate((
+                self.teacher_grid,
+                np.full((teachers - len(self.teacher_grid), self.slots), -1, dtype=np.int16),
+            ))
+        for obj in (*registry.classes, *registry.teachers):
+            obj.store = self
+
+
+class Registry(object):
+    """
+    The models of one load. Each course, teacher and class gets a dense integer id, its
+    index here, when it is created. The models are interned: one object for each id, so
+    they compare and hash by identity, and the hot structures are keyed by the ids.
+    """
+
+    def __init__(self):
+        self.courses: list[Course] = []
+        self.teachers: list[Teacher] = []
+        self.classes: list[Class] = []
+        self.store: TimetableStore | None = None
+
+    def add_course(self, course: Course) -> int:
+        self.courses.append(course)
+        return len(self.courses) - 1
+
+    def add_teacher(self, teacher: "Teacher") -> int:
+        self.teachers.append(teacher)
+        return len(self.teachers) - 1
+
+    def add_class(self, class_obj: "Class") -> int:
+        self.classes.append(class_obj)
+        return len(self.classes) - 1
+
+
+REGISTRY = Registry()
+
+
+def new_registry() -> Registry:
+    """
+    Start a new load, the models created after it get ids from 0.
+    """
+    global REGISTRY
+    REGISTRY = Registry()
+    return REGISTRY
+
+
+def set_registry(registry: Registry) -> None:
+    """
+    Use the registry of loaded models, such as one from a pickle.
+    """
+    global REGISTRY
+    REGISTRY = registry
 
 
 # COPY VARIABLES
@@ -252,15 +633,44 @@ COURSE_TABLE: CourseTable = None
 
 
 def initialize(
-    all_courses: dict, all_teachers: dict, all_classes: dict, course_table: CourseTable
+    all_courses: dict, all_teachers: dict, all_classes: dict, course_table: CourseTable,
+    pinned: list[tuple[CourseTime, Course, list[Class]]] = (),
 ):
+    """
+    :param pinned: The advance decisions, see `TimetableStore.update_availability()`
+    """
     global ALL_COURSES, ALL_TEACHERS, ALL_CLASSES, COURSE_TABLE
+    # Keep the store of the loaded models, a new model only gets a row in it.
+    if REGISTRY.store is None:
+        REGISTRY.store = TimetableStore(REGISTRY)
+    REGISTRY.store.attach()
+    REGISTRY.store.update_availability(pinned)
+
     ALL_COURSES = all_courses.copy()
     ALL_TEACHERS = all_teachers.copy()
     ALL_CLASSES = all_classes.copy()
     COURSE_TABLE = copy.copy(course_table)
 
 
+class ScheduleError(ValueError):
+    """
+    The courses can not be scheduled with the given settings.
+    """
+
+
+class InfeasibleSlotError(ScheduleError):
+    """
+    No course can be put at a course time of a class.
+    """
+
+    def __init__(self, class_num: str, time: CourseTime, message: str = None):
+        self.class_num = class_num
+        self.time = time
+        if message is None:
+            message = f"No feasible course for class {class_num} at {time}!"
+        super().__init__(message)
+
+
 class JudgeRationality:
     def __init__(
         self,
@@ -281,29 +691,38 @@ class JudgeRationality:
 
         self.all_classes = all_classes
 
+        # The reason of the last rejection: "unavailable", "teacher_busy", "daily_max" or
+        # "class_busy". None if rational.
+        self.reason: str | None = None
+
     def __call__(self, *args, **kwargs) -> (bool, bool):
+        self.reason = None
         if not self.judge_unwilling():
+            self.reason = "unavailable"
             return False, False
         if self.judge_teacher_busy_time():
+            self.reason = "teacher_busy"
             return False, False
         if self.judge_daily_max_courses():
+            self.reason = "daily_max"
             return False, True
         # TODO: I insert this sentence here, but I don't know whether it's right.
         if self.judge_class_busy_time():
+            self.reason = "class_busy"
             return False, False
         return True, False
 
     def judge_unwilling(self) -> bool:
         """
         判断教师是否不愿意教授当前课程。
+        The precomputed mask also has the prohibit periods of the course and the advance
+        decided course times of the teacher.
 
         Returns:
             bool: 如果教师不愿意教授当前课程，则返回False；否则返回True。
         """
-        unwilling_period = self.teacher.unwilling
-        if self.current_course_num in unwilling_period:
-            return False
-        return True
+        available = self.teacher.store.available.get((self.current_course.id, self.teacher.id), 0)
+        return bool(available & self.time.bit)
 
     def judge_class_busy_time(self):
         """
@@ -311,13 +730,8 @@ class JudgeRationality:
         Return True if this course time exists in the Class object's decided_courses,
         else False.
         """
-        all_classes = self.all_classes.copy()
-        this_class = all_classes[self.current_class.class_num]
-        decided_courses = this_class.decided_courses
-        for course_time, _ in decided_courses.items():
-            if course_time == self.time:
-                return True
-        return False
+        this_class = self.all_classes[self.current_class.class_num]
+        return this_class.cheek_decided_courses(self.time)
 
     def judge_teacher_busy_time(self):
         """
@@ -341,24 +755,4 @@ class JudgeRationality:
         Returning False if the course's daily max courses is not reached, else True.
         That's all, thank you.
         """
-        # Prepare some necessary variables
-        cur_course = self.current_course
-        decided_courses = self.current_class.decided_courses
-        this_day_courses = []
-        num: int = 0
-
-        # Foreach the decided courses to find this day's courses
-        for course_time, course in decided_courses.items():
-            if course_time.day == self.time.day:
-                this_day_courses.append(course)
-
-        # Foreach this day's courses to find the current course
-        for course in this_day_courses:
-            if course == cur_course:
-                num += 1
-
-        # Judge the num whether greater than the daily max courses
-        if num > cur_course.daily_max_courses:
-            return True
-        else:
-            return False
+        return self.current_class.daily_courses_full(self.time.day, self.current_course)
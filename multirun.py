@@ -0,0 +1,179 @@
+"""
+Run many independently seeded schedules in a process pool and keep the best one.
+
+Usage:
+    python multirun.py -n 16 --seed 0 --score filled --export CourseScheduleOutput.csv
+    python multirun.py -n 16 --seed 0 --selection rejection --time-budget 10
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import export
+import main
+from modules import ScheduleError
+
+
+def score_filled(timetable: dict[str, list[tuple[int, int, str]]]) -> float:
+    """
+    The number of decided course times of all classes.
+    """
+    return float(sum(len(decided_courses) for decided_courses in timetable.values()))
+
+
+def score_spread(timetable: dict[str, list[tuple[int, int, str]]]) -> float:
+    """
+    The filled course times minus the times a course is repeated on the same day,
+    so a timetable whose subjects are spread across days scores higher.
+    """
+    repeated = 0
+    for decided_courses in timetable.values():
+        seen = set()
+        for day, _, course_name in decided_courses:
+            if (day, course_name) in seen:
+                repeated += 1
+            else:
+                seen.add((day, course_name))
+    return score_filled(timetable) - repeated
+
+
+SCORES = {
+    "filled": score_filled,
+    "spread": score_spread,
+}
+
+
+def run_attempt(
+    attempt: int,
+    seed: np.random.SeedSequence,
+    setting_file: str = None,
+    selection: str = "masked",
+    time_budget: float = None,
+) -> dict:
+    """
+    Schedule once with its own random stream. Run in a worker process.
+    :param time_budget: Seconds for this attempt, see `main.run_schedule_anytime()`.
+        The timetable may be partial then.
+    :return: The attempt's statistics, and the timetable if it succeeded.
+    """
+    start = time.perf_counter()
+    result = {"attempt": attempt, "ok": False, "complete": False, "error": None, "timetable": None}
+    try:
+        if time_budget is None:
+            all_classes = main.run_schedule(setting_file, seed=seed, selection=selection)
+            result["complete"] = True
+        else:
+            all_classes, report = main.run_schedule_anytime(
+                time_budget, setting_file, seed=seed, selection=selection
+            )
+            result["complete"] = report["complete"]
+        result["timetable"] = main.timetable_of(all_classes)
+        result["ok"] = True
+    except ScheduleError as e:
+        result["error"] = str(e)
+    result["elapsed"] = time.perf_counter() - start
+    return result
+
+
+def multi_run(
+    attempts: int,
+    seed: int = None,
+    workers: int = None,
+    score="filled",
+    setting_file: str = None,
+    selection: str = "masked",
+    time_budget: float = None,
+) -> dict:
+    """
+    Run `attempts` schedules across a process pool and return the best timetable.
+    :param attempts: The number of schedules
+    :param seed: The root seed, each attempt gets an independent child stream of it
+    :param workers: The number of processes, default to all cores
+    :param score: A name in SCORES or a callable, the higher the better
+    :param setting_file: The settings file, default to main.SETTING_FILE
+    :param selection: Passed to `data_processing.Schedule`
+    :param time_budget: Seconds for each attempt, required by the "rejection" selection,
+        which may draw forever at an infeasible course time
+    :return: {"best": best attempt or None, "score": best score, "attempts": [...],
+        "failures": failed attempt number, "elapsed": wall time}
+    :raise ValueError: If the "rejection" selection has no time budget
+    """
+    if selection == "rejection" and time_budget is None:
+        raise ValueError("The rejection selection needs a time budget for each attempt!")
+    score_func = SCORES[score] if isinstance(score, str) else score
+    if workers is None:
+        workers = os.cpu_count() or 1
+    seeds = np.random.SeedSequence(seed).spawn(attempts)
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(
+            run_attempt,
+            range(attempts),
+            seeds,
+            [setting_file] * attempts,
+            [selection] * attempts,
+            [time_budget] * attempts,
+        ))
+    elapsed = time.perf_counter() - start
+
+    best, best_score = None, None
+    stats = []
+    for result in results:
+        result_score = score_func(result["timetable"]) if result["ok"] else None
+        if result_score is not None and (best_score is None or result_score > best_score):
+            best, best_score = result, result_score
+        stats.append({
+            "attempt": result["attempt"],
+            "ok": result["ok"],
+            "complete": result["complete"],
+            "error": result["error"],
+            "elapsed": result["elapsed"],
+            "score": result_score,
+        })
+
+    return {
+        "best": best,
+        "score": best_score,
+        "attempts": stats,
+        "failures": sum(not result["ok"] for result in results),
+        "elapsed": elapsed,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", "--attempts", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("-j", "--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--score", choices=sorted(SCORES), default="filled")
+    parser.add_argument("--selection", choices=["masked", "rejection"], default="masked")
+    parser.add_argument(
+        "--time-budget", type=float, default=None, metavar="SECONDS",
+        help="Seconds for each attempt, required by --selection rejection",
+    )
+    parser.add_argument("--settings", default=main.SETTING_FILE)
+    parser.add_argument("--export", default=None, help="Export the best timetable to this csv file")
+    args = parser.parse_args()
+    if args.selection == "rejection" and args.time_budget is None:
+        parser.error("--selection rejection requires --time-budget")
+
+    output = multi_run(
+        args.attempts, args.seed, args.workers, args.score, args.settings, args.selection,
+        args.time_budget,
+    )
+    print(json.dumps(
+        {key: value for key, value in output.items() if key != "best"},
+        ensure_ascii=False, indent=2,
+    ))
+
+    if output["best"] is None:
+        raise SystemExit("All the attempts failed!")
+    if args.export:
+        main.load(args.settings)
+        main.apply_timetable(output["best"]["timetable"])
+        export.export_data(main.ALL_CLASSES.items(), args.export)
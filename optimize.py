@@ -0,0 +1,340 @@
+"""
+Local search improvement of a finished timetable (simulated annealing).
+
+The hard rules are kept by every move: a teacher teaches one class at a time, the daily
+max courses and the availability of each course (the teacher's unwilling course times
+and the prohibit course times of the course). The soft goals are scored as a
+cost, the lower the better:
+- spread: the pairs of the same course on the same day of a class,
+- preference: how far each course is from the highest probability of its course time
+  in 'course_schedule',
+- gaps: the idle course times of a teacher between the first and the last course of a day.
+"""
+import math
+import time as time_
+
+import numpy as np
+
+from modules import Class, Course, Teacher, COURSE_TIMES, WEEKDAYS
+from probability import PROBABILITY_MODES, ProbabilityTable
+
+DEFAULT_WEIGHTS = {"spread": 1.0, "preference": 1.0, "gaps": 1.0}
+
+
+class LocalSearch(object):
+    """
+    Improve the decided courses of the classes in place.
+    Only the normal courses (mode=0~3) are moved, the elective, special and `pinned`
+    courses stay where they are.
+    """
+
+    def __init__(
+        self,
+        all_classes: dict[str, Class],
+        probability_table: ProbabilityTable,
+        weights: dict[str, float] = None,
+        pinned: set[tuple[str, int]] = None,
+        seed: int | np.random.SeedSequence = None,
+        rng: np.random.Generator = None,
+    ):
+        """
+        :param all_classes: The scheduled classes
+        :param probability_table: The probability of each course time and mode
+        :param weights: The weight of each soft goal, see DEFAULT_WEIGHTS
+        :param pinned: (class_num, course time id) which must not be moved
+        :param seed: The seed of the random generator, ignored if `rng` is given
+        """
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.rng = rng if rng is not None else np.random.default_rng(seed)
+        pinned = pinned or set()
+
+        self.classes: list[Class] = list(all_classes.values())
+        self.depth = probability_table.depth
+        self.days = len(WEEKDAYS)
+        self.slots = len(COURSE_TIMES)
+
+        # Index the courses
+        self.courses: list[Course] = []
+        course_index: dict[int, int] = {}
+        for class_obj in self.classes:
+            for course in class_obj.decided_courses.values():
+                if course.id not in course_index:
+                    course_index[course.id] = len(self.courses)
+                    self.courses.append(course)
+        self.course_num = len(self.courses)
+
+        # Preference cost of each (course time, course)
+        row_max = probability_table.weights.max(axis=1)
+        row_max[row_max == 0] = 1
+        self.preference = [
+            [
+                1 - float(probability_table.weights[period, course.mode] / row_max[period])
+                if course.mode in PROBABILITY_MODES else 0.0
+                for course in self.courses
+            ]
+            for period in range(self.depth)
+        ]
+
+        # grid[c][slot]: course index, -1 if free. teacher_of[c][k], available[c][k]: the
+        # course time mask of `Class.available()`
+        self.grid: list[list[int]] = []
+        self.movable: list[list[int]] = []
+        self.teacher_of: list[list[Teacher | None]] = []
+        self.available: list[list[int]] = []
+        for class_obj in self.classes:
+            row = [-1] * self.slots
+            movable = []
+            for course_time, course in class_obj.decided_courses.items():
+                row[course_time.id] = course_index[course.id]
+                if (
+                    course.mode in PROBABILITY_MODES
+                    and (class_obj.class_num, course_time.id) not in pinned
+                    and class_obj.teachers.get(course.name) is not None
+                ):
+                    movable.append(course_time.id)
+            self.grid.append(row)
+            self.movable.append(movable)
+            self.teacher_of.append([class_obj.teachers.get(course.name) for course in self.courses])
+            self.available.append([class_obj.available(course) for course in self.courses])
+        self.is_movable = [set(movable) for movable in self.movable]
+        self.movable_classes = [c for c, movable in enumerate(self.movable) if len(movable) >= 2]
+
+        # Daily counts of each (class, day, course)
+        self.counts = [0] * (len(self.classes) * (self.days + 1) * self.course_num)
+        for c, row in enumerate(self.grid):
+            for slot, k in enumerate(row):
+                if k >= 0:
+                    self.counts[self._count_key(c, COURSE_TIMES[slot].day, k)] += 1
+
+        # Busy course times of each (teacher, day) as a bitmask of periods, and which
+        # movable class the teacher teaches at each course time.
+        # All keyed by `Teacher.id`.
+        self.teacher_masks: dict[tuple[int, int], int] = {}
+        self.teacher_at: dict[int, dict[int, int]] = {}
+        for class_obj in self.classes:
+            for teacher in class_obj.teachers.values():
+                if teacher.id in self.teacher_at:
+                    continue
+                self.teacher_at[teacher.id] = {}
+                for course_time in teacher.busy_courses:
+                    key = (teacher.id, course_time.day)
+                    self.teacher_masks[key] = self.teacher_masks.get(key, 0) | 1 << (course_time.course_time - 1)
+        for c, movable in enumerate(self.movable):
+            for slot in movable:
+                self.teacher_at[self.teacher_of[c][self.grid[c][slot]].id][slot] = c
+
+        self.cost = self._total_cost()
+
+    # --- cost ---
+
+    def _count_key(self, c: int, day: int, k: int) -> int:
+        return (c * (self.days + 1) + day) * self.course_num + k
+
+    @staticmethod
+    def _gaps(mask: int) -> int:
+        if not mask:
+            return 0
+        low = (mask & -mask).bit_length()
+        return mask.bit_length() - low + 1 - mask.bit_count()
+
+    def _total_cost(self) -> float:
+        spread = sum(n * (n - 1) // 2 for n in self.counts)
+        preference = 0.0
+        for c, movable in enumerate(self.movable):
+            for slot in movable:
+                preference += self.preference[COURSE_TIMES[slot].course_time - 1][self.grid[c][slot]]
+        gaps = sum(self._gaps(mask) for mask in self.teacher_masks.values())
+        return (
+            self.weights["spread"] * spread
+            + self.weights["preference"] * preference
+            + self.weights["gaps"] * gaps
+        )
+
+    def _local_cost(self, count_keys: set, teacher_keys: set, entries: list[tuple[int, int]]) -> float:
+        """
+        The part of the cost which depends on the given counts, teacher days and entries.
+        """
+        spread = 0
+        for key in count_keys:
+            n = self.counts[key]
+            spread += n * (n - 1) // 2
+        gaps = 0
+        for key in teacher_keys:
+            gaps += self._gaps(self.teacher_masks.get(key, 0))
+        preference = 0.0
+        for c, slot in entries:
+            preference += self.preference[COURSE_TIMES[slot].course_time - 1][self.grid[c][slot]]
+        return (
+            self.weights["spread"] * spread
+            + self.weights["preference"] * preference
+            + self.weights["gaps"] * gaps
+        )
+
+    # --- moves ---
+
+    def _remove(self, c: int, slot: int, k: int) -> None:
+        course_time = COURSE_TIMES[slot]
+        teacher_id = self.teacher_of[c][k].id
+        self.grid[c][slot] = -1
+        self.counts[self._count_key(c, course_time.day, k)] -= 1
+        key = (teacher_id, course_time.day)
+        self.teacher_masks[key] &= ~(1 << (course_time.course_time - 1))
+        del self.teacher_at[teacher_id][slot]
+
+    def _can_add(self, c: int, slot: int, k: int) -> bool:
+        """
+        Whether course k can be put to the free `slot` of class c under the hard rules.
+        """
+        course_time = COURSE_TIMES[slot]
+        teacher_id = self.teacher_of[c][k].id
+        if not self.available[c][k] & course_time.bit:
+            return False
+        if self.teacher_masks.get((teacher_id, course_time.day), 0) & 1 << (course_time.course_time - 1):
+            return False
+        return self.counts[self._count_key(c, course_time.day, k)] <= self.courses[k].daily_max_courses
+
+    def _add(self, c: int, slot: int, k: int) -> None:
+        course_time = COURSE_TIMES[slot]
+        teacher_id = self.teacher_of[c][k].id
+        key = (teacher_id, course_time.day)
+        self.grid[c][slot] = k
+        self.counts[self._count_key(c, course_time.day, k)] += 1
+        self.teacher_masks[key] = self.teacher_masks.get(key, 0) | 1 << (course_time.course_time - 1)
+        self.teacher_at[teacher_id][slot] = c
+
+    def _relocate(self, moves: list[tuple[int, int, int, int]]) -> bool:
+        """
+        Move each (class, from slot, to slot, course) at the same time.
+        :return: False and nothing changed if a hard rule would be broken
+        """
+        for c, slot_from, _, k in moves:
+            self._remove(c, slot_from, k)
+        for index, (c, _, slot_to, k) in enumerate(moves):
+            if not self._can_add(c, slot_to, k):
+                for c_, _, slot_to_, k_ in moves[:index]:
+                    self._remove(c_, slot_to_, k_)
+                for c_, slot_from_, _, k_ in moves:
+                    self._add(c_, slot_from_, k_)
+                return False
+            self._add(c, slot_to, k)
+        return True
+
+    def _undo(self, moves: list[tuple[int, int, int, int]]) -> None:
+        for c, _, slot_to, k in moves:
+            self._remove(c, slot_to, k)
+        for c, slot_from, _, k in moves:
+            self._add(c, slot_from, k)
+
+    def _try(self, moves: list[tuple[int, int, int, int]], temperature: float) -> bool:
+        """
+        Apply the moves if they keep the hard rules and pass the annealing criterion.
+        The cost delta only looks at the counts and teacher days the moves touch.
+        """
+        count_keys = set()
+        teacher_keys = set()
+        entries = set()
+        for c, slot_from, slot_to, k in moves:
+            teacher_id = self.teacher_of[c][k].id
+            for slot in (slot_from, slot_to):
+                day = COURSE_TIMES[slot].day
+                count_keys.add(self._count_key(c, day, k))
+                teacher_keys.add((teacher_id, day))
+                entries.add((c, slot))
+        before = self._local_cost(count_keys, teacher_keys, entries)
+        if not self._relocate(moves):
+            return False
+        delta = self._local_cost(count_keys, teacher_keys, entries) - before
+        if delta <= 0 or self.rng.random() < math.exp(-delta / temperature):
+            self.cost += delta
+            return True
+        self._undo(moves)
+        return False
+
+    def _swap_in_class(self) -> list[tuple[int, int, int, int]] | None:
+        c = self.movable_classes[int(self.rng.integers(len(self.movable_classes)))]
+        movable = self.movable[c]
+        slot_1 = movable[int(self.rng.integers(len(movable)))]
+        slot_2 = movable[int(self.rng.integers(len(movable)))]
+        k_1, k_2 = self.grid[c][slot_1], self.grid[c][slot_2]
+        if k_1 == k_2:
+            return None
+        return [(c, slot_1, slot_2, k_1), (c, slot_2, slot_1, k_2)]
+
+    def _swap_across_classes(self) -> list[tuple[int, int, int, int]] | None:
+        """
+        A teacher who teaches class c at slot_1 and class d at slot_2 swaps the two
+        course times, and both classes swap the other course at those times.
+        """
+        c = self.movable_classes[int(self.rng.integers(len(self.movable_classes)))]
+        movable = self.movable[c]
+        slot_1 = movable[int(self.rng.integers(len(movable)))]
+        k = self.grid[c][slot_1]
+        teacher_slots = self.teacher_at[self.teacher_of[c][k].id]
+        if len(teacher_slots) < 2:
+            return None
+        slot_2 = list(teacher_slots)[int(self.rng.integers(len(teacher_slots)))]
+        d = teacher_slots[slot_2]
+        if d == c or slot_2 not in self.is_movable[c] or slot_1 not in self.is_movable[d]:
+            return None
+        return [
+            (c, slot_1, slot_2, k),
+            (c, slot_2, slot_1, self.grid[c][slot_2]),
+            (d, slot_2, slot_1, self.grid[d][slot_2]),
+            (d, slot_1, slot_2, self.grid[d][slot_1]),
+        ]
+
+    def __call__(
+        self, time_budget: float, start_temperature: float = 1.0, end_temperature: float = 0.01
+    ) -> dict:
+        """
+        Anneal until `time_budget` seconds run out, then write the result to the classes
+        and teachers.
+        :return: A report of the costs and moves
+        """
+        initial_cost = self.cost
+        start = time_.perf_counter()
+        iterations = accepted = 0
+        temperature = start_temperature
+        if self.movable_classes:
+            while True:
+                if iterations % 256 == 0:
+                    progress = (time_.perf_counter() - start) / time_budget if time_budget > 0 else 1
+                    if progress >= 1:
+                        break
+                    temperature = start_temperature * (end_temperature / start_temperature) ** progress
+                iterations += 1
+                if self.rng.random() < 0.5:
+                    moves = self._swap_in_class()
+                else:
+                    moves = self._swap_across_classes()
+                if moves is not None and self._try(moves, temperature):
+                    accepted += 1
+
+        self._write_back()
+        return {
+            "initial_cost": initial_cost,
+            "final_cost": self.cost,
+            "iterations": iterations,
+            "accepted": accepted,
+            "elapsed": time_.perf_counter() - start,
+        }
+
+    def _write_back(self) -> None:
+        """
+        Put the grid back into Class.decided_courses and Teacher.busy_courses.
+        """
+        changed = []
+        for c, movable in enumerate(self.movable):
+            class_obj = self.classes[c]
+            for slot in movable:
+                course_time = COURSE_TIMES[slot]
+                new_course = self.courses[self.grid[c][slot]]
+                old_course = class_obj.decided_courses[course_time]
+                if new_course is not old_course:
+                    changed.append((class_obj, course_time, old_course, new_course))
+        for class_obj, course_time, old_course, _ in changed:
+            class_obj.remove_decided_course(course_time)
+            class_obj.teachers[old_course.name].remove_busy_course(course_time)
+        for class_obj, course_time, _, new_course in changed:
+            class_obj.add_decided_course([(course_time, new_course)])
+            class_obj.teachers[new_course.name].add_busy_course(new_course, course_time)
@@ -0,0 +1,129 @@
+"""
+Override patches applied to the loaded settings, without parsing settings.yaml again.
+
+A patch is a dict, each key is optional:
+    {
+        "course_hours": {"文科": {"语文": 20}},                  # hours in the settings, before advance decisions
+        "course_schedule": {1: {0: 3, 3: 0}},                  # probability of modes at a course time
+        "courses": {"体育": {"max_daily_courses": 1, "prohibit": [1, 2]}},
+        "teachers": {"张三": {"unwilling": [1, 13]},
+                     "新老师": {"course": ["数学"], "unwilling": []}},  # new teacher
+        "classes": {101: {"teachers": {"数学": "新老师"}}},
+    }
+
+A long running process keeps its loaded settings with `set_base()`, and starts each
+request or scenario from them with `reload()`.
+"""
+import main
+import modules
+
+PATCH_KEYS = ("course_hours", "course_schedule", "courses", "teachers", "classes")
+
+# The base settings of this process, see `main.dump_state()`
+_BASE_STATE: bytes = b""
+
+
+def set_base(state: bytes = None) -> None:
+    """
+    Keep the base settings of `reload()`.
+    :param state: The result of `main.dump_state()`, default to the loaded settings
+    """
+    global _BASE_STATE
+    _BASE_STATE = main.dump_state() if state is None else state
+
+
+def reload(patch: dict) -> None:
+    """
+    Restore the base settings of `set_base()` and apply the patch to them.
+    :raise ValueError: See `apply_overrides()`
+    """
+    main.load_state(_BASE_STATE)
+    apply_overrides(patch)
+
+
+def apply_overrides(patch: dict) -> None:
+    """
+    Apply the patch to the loaded model (the global variables of main).
+    :raise ValueError: If the patch refers to an unknown key, course, teacher or class
+    """
+    unknown = set(patch) - set(PATCH_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown override keys {sorted(unknown)}, expect {PATCH_KEYS}")
+
+    for course_type, hours in (patch.get("course_hours") or {}).items():
+        subjects = main.COURSE_HOURS.get(course_type)
+        if subjects is None:
+            raise ValueError(f"Unknown course type '{course_type}' in 'course_hours'!")
+        for course_name, course_hours in hours.items():
+            if course_name not in main.ALL_COURSES:
+                raise ValueError(f"Course '{course_name}' not found in ALL_COURSES!")
+            # The advance decided courses are minus from the hours, as `main.load()` does.
+            advance = sum(course.name == course_name for _, course in main.advance_decision_courses)
+            if course_hours - advance < 0:
+                raise ValueError(f"The course '{course_name}' is not enough!")
+            for subject in subjects:
+                if course_name in subject:
+                    subject[course_name] = course_hours - advance
+                    break
+            else:
+                subjects.append({course_name: course_hours - advance})
+
+    for course_num, probability in (patch.get("course_schedule") or {}).items():
+        course_num = int(course_num)
+        if course_num not in main.course_probability:
+            raise ValueError(f"Unknown course time {course_num} in 'course_schedule'!")
+        main.course_probability[course_num].update(
+            {int(mode): value for mode, value in probability.items()}
+        )
+
+    for course_name, info in (patch.get("courses") or {}).items():
+        course = main.ALL_COURSES.get(course_name)
+        if course is None:
+            raise ValueError(f"Course '{course_name}' not found in ALL_COURSES!")
+        if "max_daily_courses" in info:
+            if info["max_daily_courses"] < 0:
+                raise ValueError("The max_daily_courses must be greater than or equal to 0!")
+            course.daily_max_courses = info["max_daily_courses"]
+        if "prohibit" in info:
+            course.prohibit = list(info["prohibit"])
+
+    for teacher_name, info in (patch.get("teachers") or {}).items():
+        teacher = main.ALL_TEACHERS.get(teacher_name)
+        if teacher is None:
+            if not info.get("course"):
+                raise ValueError(f"The new teacher '{teacher_name}' must have a 'course'!")
+            teacher = modules.Teacher(teacher_name)
+            teacher.courses.append(info["course"][0])
+            main.ALL_TEACHERS[teacher_name] = teacher
+        if "unwilling" in info:
+            teacher.unwilling = []
+            teacher.add_unwilling(list(info["unwilling"]))
+
+    for class_num, info in (patch.get("classes") or {}).items():
+        class_obj = main.ALL_CLASSES.get(str(class_num))
+        if class_obj is None:
+            raise ValueError(f"Class '{class_num}' not found in ALL_CLASSES!")
+        for course_name, teacher_name in (info.get("teachers") or {}).items():
+            if course_name not in main.ALL_COURSES:
+                raise ValueError(f"Course '{course_name}' not found in ALL_COURSES!")
+            if teacher_name not in main.ALL_TEACHERS:
+                raise ValueError(f"Teacher '{teacher_name}' not found in ALL_TEACHERS!")
+            class_obj.teachers[course_name] = main.ALL_TEACHERS[teacher_name]
+
+    main.initialize()
+
+
+def changed_teachers(patch: dict) -> set[str]:
+    """
+    The teachers whose course times the patch may break, for `reschedule`: the patched
+    teachers, the new teachers of the classes and the teachers of the patched courses.
+    """
+    teachers = set(patch.get("teachers") or {})
+    for info in (patch.get("classes") or {}).values():
+        teachers.update((info.get("teachers") or {}).values())
+    courses = set(patch.get("courses") or {})
+    for class_obj in main.ALL_CLASSES.values():
+        for course_name, teacher in class_obj.teachers.items():
+            if course_name in courses and teacher is not None:
+                teachers.add(teacher.name)
+    return teachers
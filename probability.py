@@ -0,0 +1,194 @@
+"""
+Probability tables and the demand pool for course scheduling.
+"""
+import numpy as np
+
+from modules import Course
+
+# 基础科目配置(其中mode=0为必修,mode=1为物理或历史,mode=2为选课,mode=3为副科, mode=4是走班,
+# mode=5是特殊课程). Only mode 0~3 are drawn by probability, mode 4 and mode 5 are
+# scheduled by other means and always get weight 0.
+MODE_NUM = 6
+PROBABILITY_MODES = (0, 1, 2, 3)
+
+
+class ProbabilityTable(object):
+    """
+    A (course time x mode) weight matrix built once from 'course_schedule' in settings.yaml.
+    """
+
+    def __init__(self, course_probability: dict[int, dict[int, float]], depth: int):
+        """
+        :param course_probability: {course_num: {mode: probability}}
+        :param depth: The number of courses in a day
+        """
+        self.depth = depth
+
+        self.weights = np.zeros((depth, MODE_NUM), dtype=np.float64)
+        for course_num in range(1, depth + 1):
+            mode_probability = course_probability.get(course_num)
+            if mode_probability is None:
+                raise ValueError(f"The probability of course {course_num} is not set!")
+            for mode in PROBABILITY_MODES:
+                self.weights[course_num - 1, mode] = mode_probability.get(mode, 0)
+
+    @staticmethod
+    def modes_of(courses: list[Course]) -> np.ndarray:
+        """
+        The mode of each course as an index array.
+        """
+        modes = np.fromiter((course.mode for course in courses), dtype=np.intp, count=len(courses))
+        if modes.size and (modes.min() < 0 or modes.max() >= MODE_NUM):
+            bad_mode = modes[(modes < 0) | (modes >= MODE_NUM)][0]
+            raise ValueError(
+                f"Unexpected mode {bad_mode}. "
+                f"其中mode=0为必修,mode=1为物理或历史,mode=2为选课,mode=3为副科, "
+                f"mode=4是走班(对于理科mode=1, 见classes)"
+            )
+        return modes
+
+
+class FenwickTree(object):
+    """
+    The prefix sums of a list of counts, updated and searched in O(log n).
+    """
+
+    __slots__ = ("tree", "total")
+
+    def __init__(self, counts: list[int]):
+        size = len(counts)
+        self.tree = [0] + list(counts)
+        for index in range(1, size + 1):
+            parent = index + (index & -index)
+            if parent <= size:
+                self.tree[parent] += self.tree[index]
+        self.total = sum(counts)
+
+    def add(self, index: int, delta: int) -> None:
+        """
+        Add `delta` to the count at `index` (counted from 0).
+        """
+        self.total += delta
+        index += 1
+        size = len(self.tree)
+        while index < size:
+            self.tree[index] += delta
+            index += index & -index
+
+    def find(self, value: int) -> int:
+        """
+        :param value: 0 <= value < total
+        :return: The first index whose prefix sum (inclusive) is greater than `value`
+        """
+        tree = self.tree
+        size = len(tree) - 1
+        position = 0
+        step = 1 << (size.bit_length() - 1) if size else 0
+        while step:
+            following = position + step
+            if following <= size and tree[following] <= value:
+                position = following
+                value -= tree[following]
+            step >>= 1
+        return position
+
+
+class DemandPool(object):
+    """
+    The remaining hours of each distinct course of a class, and weighted draws from them.
+
+    The weight of a course at a course time is the probability of its mode at that time
+    times its remaining hours, the same as drawing from the courses repeated by their
+    hours. The hours are kept in one Fenwick tree per mode: a draw picks a mode from the
+    few mode totals, then a course in the tree of that mode, with one random number.
+    """
+
+    def __init__(self, courses: list[Course], table: ProbabilityTable):
+        """
+        :param courses: The courses repeated by their hours, see `main.build_courses_list()`
+        :param table: The weights of the modes at each course time
+        """
+        hours: dict[Course, int] = {}
+        for course in courses:
+            hours[course] = hours.get(course, 0) + 1
+        self.courses: list[Course] = list(hours)
+        self.hours: list[int] = list(hours.values())
+        self.weights = table.weights
+
+        modes = ProbabilityTable.modes_of(self.courses).tolist()
+        self.modes: list[int] = list(dict.fromkeys(modes))
+        # The indexes of the courses of each mode, in the order of `self.modes`
+        self.members: list[list[int]] = [
+            [index for index, course_mode in enumerate(modes) if course_mode == mode] for mode in self.modes
+        ]
+        # index -> (the group of its mode, its position in the group)
+        self.position: list[tuple[int, int]] = [None] * len(self.courses)
+        for group, members in enumerate(self.members):
+            for position, index in enumerate(members):
+                self.position[index] = (group, position)
+
+        self.trees: list[FenwickTree] = []
+        self.remaining: list[int] = []
+        self.excluded: list[int] = []
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Refill the hours of all the courses, for the next class.
+        """
+        self.remaining = list(self.hours)
+        self.trees = [FenwickTree([self.hours[index] for index in members]) for members in self.members]
+        self.excluded = []
+
+    def take(self, index: int) -> None:
+        """
+        Use one hour of the course at `index`.
+        """
+        group, position = self.position[index]
+        self.remaining[index] -= 1
+        self.trees[group].add(position, -1)
+
+    def exclude(self, index: int) -> None:
+        """
+        Leave the course at `index` out of the draws until `restore()`, such as a course
+        which is not feasible at the current course time.
+        """
+        hours = self.remaining[index]
+        if hours and index not in self.excluded:
+            group, position = self.position[index]
+            self.trees[group].add(position, -hours)
+            self.excluded.append(index)
+
+    def restore(self) -> None:
+        """
+        Put back the excluded courses.
+        """
+        for index in self.excluded:
+            group, position = self.position[index]
+            self.trees[group].add(position, self.remaining[index])
+        self.excluded = []
+
+    def choose(self, course_time: int, rng: np.random.Generator) -> int:
+        """
+        Draw a course by the weights at `course_time` (counted from 1).
+        :return: The index of the course in `self.courses`
+        :raise ValueError: If no course has a weight at `course_time`
+        """
+        mode_weights = self.weights[course_time - 1]
+        weights = [mode_weights[mode] * tree.total for mode, tree in zip(self.modes, self.trees)]
+        total = sum(weights)
+        if total <= 0:
+            raise ValueError("Total of weights must be greater than zero.")
+
+        value = rng.random() * total
+        group = 0
+        for group, weight in enumerate(weights):
+            if value < weight:
+                break
+            value -= weight
+        # Guard against the float error on the last mode
+        while not weights[group]:
+            group -= 1
+        tree = self.trees[group]
+        hours = min(int(value / mode_weights[self.modes[group]]), tree.total - 1)
+        return self.members[group][tree.find(hours)]
@@ -0,0 +1,312 @@
+"""
+Reschedule incrementally after a small change of the settings.
+
+The previous timetable (such as the exported csv) is loaded with the new settings. Only
+the course times which the change affects are freed and solved again by the backtracking
+solver, the others stay as they are.
+
+Usage:
+    python reschedule.py --previous CourseScheduleOutput.csv --settings settings.yaml \
+        --old-settings old_settings.yaml --output CourseScheduleOutput.csv
+"""
+import argparse
+import json
+import time
+from typing import Callable
+
+import yaml
+
+import export
+import main
+import modules
+import solver
+from probability import PROBABILITY_MODES
+
+
+def diff_settings(old_settings: dict, new_settings: dict) -> set[str]:
+    """
+    The teachers which the new settings change: a teacher whose courses or unwilling
+    course times changed, who is the new teacher of a course of a class, or who teaches
+    a course whose max daily courses or prohibit course times changed.
+    :return: The teacher names
+    """
+    def teachers_of(settings: dict) -> dict[str, tuple]:
+        return {
+            teacher["name"]: (tuple(teacher.get("course") or ()), tuple(sorted(teacher.get("unwilling") or ())))
+            for teacher in settings.get("teachers") or []
+        }
+
+    def courses_of(settings: dict) -> dict[str, tuple]:
+        return {
+            course_name: (info.get("max_daily_courses"), tuple(sorted(info.get("prohibit") or ())))
+            for section in ("courses", "elective_courses")
+            for course_dict in settings.get(section) or []
+            for course_name, info in course_dict.items()
+        }
+
+    def class_teachers_of(settings: dict) -> dict[str, dict[str, str]]:
+        class_teachers = {}
+        for class_dict in settings.get("classes") or []:
+            for class_num, value in class_dict.items():
+                class_teachers[str(class_num)] = value.get("teachers") or {}
+        return class_teachers
+
+    changed = set()
+    old_teachers, new_teachers = teachers_of(old_settings), teachers_of(new_settings)
+    for name, info in new_teachers.items():
+        if old_teachers.get(name) != info:
+            changed.add(name)
+
+    old_classes = class_teachers_of(old_settings)
+    for class_num, course_teachers in class_teachers_of(new_settings).items():
+        old_course_teachers = old_classes.get(class_num, {})
+        for course_name, teacher_name in course_teachers.items():
+            if old_course_teachers.get(course_name) != teacher_name:
+                changed.add(teacher_name)
+
+    old_courses = courses_of(old_settings)
+    changed_courses = {
+        course_name for course_name, info in courses_of(new_settings).items()
+        if old_courses.get(course_name) != info
+    }
+    for course_teachers in class_teachers_of(new_settings).values():
+        for course_name, teacher_name in course_teachers.items():
+            if course_name in changed_courses:
+                changed.add(teacher_name)
+    return changed
+
+
+def find_conflicts(timetable: dict[str, list[tuple[int, int, str]]]) -> set[str]:
+    """
+    The teachers whose course times in `timetable` break the loaded settings: unwilling
+    or prohibit course times, teaching two classes at the same time, or a course over
+    its max daily courses in a class.
+    :return: The teacher names
+    """
+    conflicts = set()
+    busy: dict[tuple[str, int], str] = {}
+    for class_num, decided_courses in timetable.items():
+        class_obj = main.ALL_CLASSES[str(class_num)]
+        daily: dict[tuple[int, str], int] = {}
+        for day, course_time, course_name in decided_courses:
+            course = main.ALL_COURSES[course_name]
+            teacher = class_obj.teachers.get(course_name)
+            if course.mode not in PROBABILITY_MODES or teacher is None:
+                continue
+            if course_time in teacher.unwilling or course_time in course.prohibit:
+                conflicts.add(teacher.name)
+            daily[(day, course_name)] = daily.get((day, course_name), 0) + 1
+            if daily[(day, course_name)] > course.daily_max_courses + 1:
+                conflicts.add(teacher.name)
+            key = (teacher.name, modules.CourseTime(day, course_time).id)
+            if key in busy:
+                conflicts.add(teacher.name)
+            busy[key] = class_num
+    return conflicts
+
+
+def split_timetable(
+    timetable: dict[str, list[tuple[int, int, str]]],
+    teachers: set[str],
+    whole_classes: bool = False,
+) -> tuple[dict[str, list[tuple[int, int, str]]], set[str]]:
+    """
+    Split the timetable into the pinned courses and the freed classes.
+    A normal course is freed if its teacher is in `teachers`, if the class has no teacher
+    for it any more, or if it is over the course hours. With `whole_classes`, all the
+    normal courses of a class which has such a teacher are freed.
+    :return: (pinned timetable, numbers of the classes which have freed course times)
+    """
+    hours: dict[str, int] = {}
+    for course in main.build_courses_list():
+        hours[course.name] = hours.get(course.name, 0) + 1
+
+    pinned: dict[str, list[tuple[int, int, str]]] = {}
+    freed_classes = set()
+    for class_num, decided_courses in timetable.items():
+        class_obj = main.ALL_CLASSES[str(class_num)]
+        if whole_classes and any(
+            teacher is not None and teacher.name in teachers
+            for teacher in class_obj.teachers.values()
+        ):
+            freed_classes.add(class_num)
+            pinned[class_num] = [
+                entry for entry in decided_courses
+                if main.ALL_COURSES[entry[2]].mode not in PROBABILITY_MODES
+            ]
+            continue
+
+        used: dict[str, int] = {}
+        pinned[class_num] = []
+        for day, course_time, course_name in decided_courses:
+            if main.ALL_COURSES[course_name].mode in PROBABILITY_MODES:
+                teacher = class_obj.teachers.get(course_name)
+                used[course_name] = used.get(course_name, 0) + 1
+                if (
+                    teacher is None
+                    or teacher.name in teachers
+                    or used[course_name] > hours.get(course_name, 0)
+                ):
+                    freed_classes.add(class_num)
+                    continue
+            pinned[class_num].append((day, course_time, course_name))
+    return pinned, freed_classes
+
+
+def validate_timetable(timetable: dict[str, list[tuple[int, int, str]]]) -> list[str]:
+    """
+    Check a timetable against the loaded settings: unknown courses, a course without a
+    teacher, unwilling and prohibit course times, a teacher in two places at once, the
+    daily max courses and more normal courses than their hours.
+    :return: A message for each violation, empty if the timetable is valid
+    """
+    hours: dict[str, int] = {}
+    for course in main.build_courses_list():
+        hours[course.name] = hours.get(course.name, 0) + 1
+
+    violations = []
+    # (teacher name, course time id): (course name, class numbers)
+    busy: dict[tuple[str, int], tuple[str, list[str]]] = {}
+    for class_num, decided_courses in timetable.items():
+        class_obj = main.ALL_CLASSES.get(str(class_num))
+        if class_obj is None:
+            violations.append(f"Unknown class {class_num}")
+            continue
+        seen_times = set()
+        daily: dict[tuple[int, str], int] = {}
+        used: dict[str, int] = {}
+        for day, course_time, course_name in decided_courses:
+            course = main.ALL_COURSES.get(course_name)
+            if course is None:
+                violations.append(f"Unknown course {course_name} of class {class_num}")
+                continue
+            time_obj = modules.CourseTime(day, course_time)
+            if time_obj.id in seen_times:
+                violations.append(f"Class {class_num} has two courses at {time_obj}")
+            seen_times.add(time_obj.id)
+            daily[(day, course_name)] = daily.get((day, course_name), 0) + 1
+            if course.mode in PROBABILITY_MODES:
+                used[course_name] = used.get(course_name, 0) + 1
+            if course.mode != 5 and course_time in course.prohibit:
+                violations.append(f"Course {course_name} is prohibited at {time_obj} ({class_num})")
+
+            teacher = class_obj.teachers.get(course_name)
+            if teacher is None:
+                if course.mode != 5:
+                    violations.append(f"Class {class_num} has no teacher of {course_name}")
+                continue
+            if course.mode != 5 and course_time in teacher.unwilling:
+                violations.append(f"Teacher {teacher.name} is unwilling at {time_obj} ({class_num})")
+            key = (teacher.name, time_obj.id)
+            if key in busy:
+                other_course, other_classes = busy[key]
+                # The classes of an elective or special course share the teacher at once.
+                if other_course != course_name or course.mode in PROBABILITY_MODES:
+                    violations.append(
+                        f"Teacher {teacher.name} teaches {other_classes[0]} and {class_num} at {time_obj}"
+                    )
+                other_classes.append(class_num)
+            else:
+                busy[key] = (course_name, [class_num])
+
+        for (day, course_name), num in daily.items():
+            if num > main.ALL_COURSES[course_name].daily_max_courses + 1:
+                violations.append(f"Class {class_num} has {num} {course_name} on day {day}")
+        for course_name, num in used.items():
+            if num > hours.get(course_name, 0):
+                violations.append(
+                    f"Class {class_num} has {num} {course_name}, more than {hours.get(course_name, 0)} hours"
+                )
+    return violations
+
+
+def reschedule_loaded(
+    previous: dict[str, list[tuple[int, int, str]]],
+    teachers: set[str],
+    reload: Callable[[], None],
+) -> dict:
+    """
+    Reschedule the course times of `previous` for the loaded settings.
+    First only the course times of the affected teachers (`teachers` and the ones which
+    break the settings) are freed, if they can not be solved, all the normal courses of
+    the classes sharing those teachers are freed.
+    :param reload: Reset the model to the loaded settings, for the second try
+    :return: {"classes": ALL_CLASSES, "teachers": affected teacher names,
+        "freed": freed course times, "whole_classes": bool}
+    :raise ScheduleError: If the freed classes can not be solved either.
+    """
+    teachers = set(teachers) | find_conflicts(previous)
+    for whole_classes in (False, True):
+        if whole_classes:
+            reload()
+        pinned, freed_classes = split_timetable(previous, teachers, whole_classes)
+        main.apply_timetable(pinned)
+        target_classes = [main.ALL_CLASSES[str(num)] for num in freed_classes]
+        course_schedule = solver.BacktrackingSolver(
+            main.ALL_COURSES, main.ALL_TEACHERS, main.ALL_CLASSES, main.COURSE_TABLE
+        )
+        try:
+            solver._Search(
+                course_schedule, target_classes, main.build_courses_list(), count_decided=True
+            ).solve()
+        except modules.ScheduleError:
+            if whole_classes:
+                raise
+            continue
+        freed = sum(len(previous[num]) - len(pinned[num]) for num in freed_classes)
+        return {
+            "classes": main.ALL_CLASSES,
+            "teachers": sorted(teachers),
+            "freed": freed,
+            "whole_classes": whole_classes,
+        }
+
+
+def reschedule(
+    previous: dict[str, list[tuple[int, int, str]]],
+    setting_file: str = None,
+    old_setting_file: str = None,
+) -> dict:
+    """
+    Reschedule the course times of `previous` affected by the settings, see
+    `reschedule_loaded()`.
+    :param previous: The previous timetable, see `main.timetable_of()`
+    :param setting_file: The new settings file, default to main.SETTING_FILE
+    :param old_setting_file: The settings of `previous`, to find the changed teachers.
+        Without it only the teachers which break the new settings are affected.
+    :return: {"classes": ALL_CLASSES, "teachers": affected teacher names,
+        "freed": freed course times, "whole_classes": bool, "elapsed": seconds}
+    :raise ScheduleError: If the freed classes can not be solved either.
+    """
+    start = time.perf_counter()
+    main.load(setting_file)
+    teachers = set()
+    if old_setting_file is not None:
+        with open(old_setting_file, "r", encoding="utf-8") as f:
+            old_settings = yaml.safe_load(f)
+        with open(setting_file or main.SETTING_FILE, "r", encoding="utf-8") as f:
+            new_settings = yaml.safe_load(f)
+        teachers = diff_settings(old_settings, new_settings)
+
+    result = reschedule_loaded(previous, teachers, lambda: main.load(setting_file))
+    result["elapsed"] = time.perf_counter() - start
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--previous", default="CourseScheduleOutput.csv", help="The previous exported csv file")
+    parser.add_argument("--settings", default=main.SETTING_FILE)
+    parser.add_argument("--old-settings", default=None, help="The settings of the previous timetable")
+    parser.add_argument("--output", default="CourseScheduleOutput.csv")
+    parser.add_argument("--encoding", choices=export.ENCODINGS, default="gbk")
+    args = parser.parse_args()
+
+    result = reschedule(
+        export.import_data(args.previous, args.encoding), args.settings, args.old_settings
+    )
+    print(json.dumps(
+        {key: value for key, value in result.items() if key != "classes"},
+        ensure_ascii=False, indent=2,
+    ))
+    export.export_data(result["classes"].items(), args.output, args.encoding)
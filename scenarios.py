@@ -0,0 +1,172 @@
+"""
+Run a batch of settings variants which share one parsed model.
+
+The base settings are loaded once, every scenario restores that model and applies its
+own override patch (see overrides.py) before it is scheduled, so a sweep of many
+variants costs about one load. All the scenarios use the same seed, so the differences
+in the summary come from the patches rather than the draws.
+
+A scenarios file is a yaml list:
+    - name: more-chinese
+      overrides:
+        course_hours: {"文科": {"语文": 20}}
+    - name: no-first-period
+      overrides:
+        course_schedule: {1: {0: 0}}
+
+Usage:
+    python scenarios.py scenarios.yaml --settings settings.yaml --seed 0 -j 4 --output summary.csv
+"""
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import yaml
+
+import export
+import main
+import multirun
+import overrides
+import reschedule
+from modules import ScheduleError
+
+SUMMARY_COLUMNS = (
+    "scenario", "ok", "complete", "filled", "unfilled", "repeated", "violations", "elapsed", "error"
+)
+
+
+def load_scenarios(filename: str) -> list[dict]:
+    """
+    Read a scenarios file.
+    :return: [{"name": str, "overrides": dict}]
+    :raise ValueError: If a scenario is not a mapping or two scenarios share a name
+    """
+    with open(filename, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f) or []
+
+    scenarios, names = [], set()
+    for index, scenario in enumerate(data):
+        if not isinstance(scenario, dict):
+            raise ValueError(f"The scenario {index} must be a mapping!")
+        name = str(scenario.get("name", index))
+        if name in names:
+            raise ValueError(f"The scenario name '{name}' is repeated!")
+        names.add(name)
+        scenarios.append({"name": name, "overrides": scenario.get("overrides") or {}})
+    return scenarios
+
+
+def run_scenario(
+    scenario: dict,
+    engine: str = "random",
+    seed: int = None,
+    time_budget: float = None,
+    schedule_kwargs: dict = None,
+) -> dict:
+    """
+    Schedule one scenario on the base model of this process.
+    :return: A row of the summary, see SUMMARY_COLUMNS, and the "timetable" if it succeeded
+    """
+    start = time.perf_counter()
+    schedule_kwargs = schedule_kwargs or {}
+    result = {"scenario": scenario["name"], "ok": False, "complete": False, "error": "", "timetable": None}
+    patch = scenario["overrides"]
+    try:
+        overrides.reload(patch)
+        if time_budget is None:
+            report = main.schedule_loaded(engine, seed=seed, **schedule_kwargs).report()
+        else:
+            _, report = main.run_schedule_anytime(
+                time_budget, engine=engine, seed=seed, reload=lambda: overrides.reload(patch), **schedule_kwargs
+            )
+    except (ScheduleError, ValueError) as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    else:
+        timetable = main.timetable_of(main.ALL_CLASSES)
+        filled = multirun.score_filled(timetable)
+        result.update({
+            "ok": True,
+            "complete": report["complete"],
+            "filled": int(filled),
+            "unfilled": len(report["unfilled"]),
+            "repeated": int(filled - multirun.score_spread(timetable)),
+            "violations": len(reschedule.validate_timetable(timetable)),
+            "timetable": timetable,
+        })
+    result["elapsed"] = round(time.perf_counter() - start, 4)
+    return result
+
+
+def run_scenarios(
+    scenarios: list[dict],
+    setting_file: str = None,
+    engine: str = "random",
+    seed: int = None,
+    workers: int = None,
+    time_budget: float = None,
+    **schedule_kwargs,
+) -> list[dict]:
+    """
+    Load the base settings once and run each scenario on a copy of it.
+    :param scenarios: See `load_scenarios()`
+    :param workers: The number of processes, default to all cores. With one worker
+        everything runs in this process.
+    :param time_budget: Seconds for each scenario, see `main.run_schedule_anytime()`.
+        Without it a scenario is scheduled once and a failure is reported as an error.
+    :param schedule_kwargs: Passed to the engine, such as selection
+    :return: The results of `run_scenario()`, in the order of `scenarios`
+    """
+    main.load(setting_file)
+    state = main.dump_state()
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(scenarios)))
+
+    arguments = (
+        scenarios,
+        [engine] * len(scenarios),
+        [seed] * len(scenarios),
+        [time_budget] * len(scenarios),
+        [schedule_kwargs] * len(scenarios),
+    )
+    if workers <= 1:
+        overrides.set_base(state)
+        return list(map(run_scenario, *arguments))
+    with ProcessPoolExecutor(max_workers=workers, initializer=overrides.set_base, initargs=(state,)) as executor:
+        return list(executor.map(run_scenario, *arguments))
+
+
+def write_summary(results: list[dict], filename: str, encoding: str = "utf-8") -> None:
+    """
+    Write one row of SUMMARY_COLUMNS for each scenario.
+    """
+    with open(filename, "w", encoding=encoding, newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("scenarios", help="The yaml file of the scenarios")
+    parser.add_argument("--settings", default=main.SETTING_FILE)
+    parser.add_argument("--output", default="ScenarioSummary.csv")
+    parser.add_argument("--encoding", choices=export.ENCODINGS, default="utf-8")
+    parser.add_argument("--engine", choices=sorted(main.ENGINES), default="random")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("-j", "--workers", type=int, default=None)
+    parser.add_argument("--time-budget", type=float, default=None, help="Seconds for each scenario")
+    parser.add_argument("--selection", choices=["masked", "rejection"], default="masked")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = run_scenarios(
+        load_scenarios(args.scenarios), args.settings, args.engine, args.seed, args.workers,
+        args.time_budget, selection=args.selection,
+    )
+    write_summary(results, args.output, args.encoding)
+    for result in results:
+        print(", ".join(f"{column}={result.get(column, '')}" for column in SUMMARY_COLUMNS))
+    print(f"{len(results)} scenarios, {time.perf_counter() - start:.3f} s")
@@ -0,0 +1,215 @@
+"""
+A resident scheduling service answering JSON lines over a Unix socket or stdin.
+
+The settings are loaded once in each worker process, every request starts from that
+model plus its own overrides (see overrides.py), so there is no cold start per request.
+
+Requests, one json object a line:
+    {"id": 1, "op": "schedule", "engine": "random", "seed": 0, "time_budget": 5, "overrides": {...}}
+    {"id": 2, "op": "reschedule", "timetable": {...}, "overrides": {...}}
+    {"id": 3, "op": "validate", "timetable": {...}, "overrides": {...}}
+    {"id": 4, "op": "ping"}
+A timetable is {class_num: [[day, course_time, course_name], ...]}, as `main.timetable_of()`.
+Responses, in the order they finish:
+    {"id": 1, "ok": true, "result": {...}} or {"id": 1, "ok": false, "error": "..."}
+
+Usage:
+    python service.py --settings settings.yaml --socket /tmp/course_schedule.sock -j 4
+    python service.py --settings settings.yaml < requests.jsonl
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import main
+import overrides
+import reschedule
+
+def _init_worker(setting_file: str) -> None:
+    main.load(setting_file)
+    overrides.set_base()
+
+
+def _timetable(data: dict) -> dict[str, list[tuple[int, int, str]]]:
+    return {
+        str(class_num): [tuple(entry) for entry in decided_courses]
+        for class_num, decided_courses in data.items()
+    }
+
+
+def handle(request: dict) -> dict:
+    """
+    Answer one request in a worker process.
+    :return: The result of the request
+    :raise ValueError: If the request is wrong or can not be scheduled
+    """
+    op = request.get("op")
+    if op == "ping":
+        return {"pid": os.getpid()}
+
+    patch = request.get("overrides") or {}
+    overrides.reload(patch)
+    if op == "schedule":
+        engine = request.get("engine", "random")
+        if engine not in main.ENGINES:
+            raise ValueError(f"Unknown engine {engine!r}, expect {sorted(main.ENGINES)}")
+        schedule_kwargs = {"selection": request.get("selection", "masked")}
+        time_budget = request.get("time_budget")
+        if time_budget is None:
+            main.schedule_loaded(engine, seed=request.get("seed"), **schedule_kwargs)
+            return {"timetable": main.timetable_of(main.ALL_CLASSES)}
+        _, report = main.run_schedule_anytime(
+            float(time_budget), engine=engine, seed=request.get("seed"),
+            reload=lambda: overrides.reload(patch), **schedule_kwargs
+        )
+        return {"timetable": main.timetable_of(main.ALL_CLASSES), "report": report}
+    if op == "reschedule":
+        result = reschedule.reschedule_loaded(
+            _timetable(request["timetable"]), overrides.changed_teachers(patch), lambda: overrides.reload(patch)
+        )
+        result["timetable"] = main.timetable_of(result.pop("classes"))
+        return result
+    if op == "validate":
+        return {"violations": reschedule.validate_timetable(_timetable(request["timetable"]))}
+    raise ValueError(f"Unknown op {op!r}")
+
+
+def run_request(request: dict) -> dict:
+    """
+    Answer one request in a worker process, the errors are part of the response.
+    """
+    response = {"id": request.get("id")}
+    try:
+        response["result"] = handle(request)
+        response["ok"] = True
+    except Exception as e:  # A bad request must not stop the service.
+        response["ok"] = False
+        response["error"] = f"{type(e).__name__}: {e}"
+    return response
+
+
+class _StdinReader(object):
+    """
+    The reader side of stdin mode, with the interface of asyncio.StreamReader used here.
+    Reading in a thread works for pipes, files and terminals alike.
+    """
+
+    async def readline(self) -> bytes:
+        return await asyncio.get_running_loop().run_in_executor(None, sys.stdin.buffer.readline)
+
+
+class _StdoutWriter(object):
+    """
+    The writer side of stdin mode, with the interface of asyncio.StreamWriter used here.
+    """
+
+    def write(self, data: bytes) -> None:
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+
+    async def drain(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class Service(object):
+    def __init__(self, setting_file: str = None, workers: int = None):
+        """
+        :param setting_file: The settings file, default to main.SETTING_FILE
+        :param workers: The number of worker processes, default to all cores
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker, initargs=(setting_file,)
+        )
+
+    async def warm_up(self) -> None:
+        """
+        Start the workers and load the settings before the first request.
+        """
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(self.executor, run_request, {"op": "ping"})
+            for _ in range(self.workers)
+        ))
+
+    async def answer(self, line: bytes) -> bytes:
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("A request must be a json object")
+        except ValueError as e:
+            response = {"id": None, "ok": False, "error": f"Bad request: {e}"}
+        else:
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(self.executor, run_request, request)
+        return (json.dumps(response, ensure_ascii=False) + "\n").encode("utf-8")
+
+    async def serve_stream(self, reader, writer) -> None:
+        """
+        Answer each line of `reader` concurrently, until it ends.
+        """
+        lock = asyncio.Lock()
+        tasks = set()
+
+        async def reply(line: bytes) -> None:
+            data = await self.answer(line)
+            async with lock:
+                writer.write(data)
+                await writer.drain()
+
+        while line := await reader.readline():
+            if not line.strip():
+                continue
+            task = asyncio.create_task(reply(line))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        writer.close()
+
+    async def serve_unix(self, path: str) -> None:
+        if os.path.exists(path):
+            os.remove(path)
+        server = await asyncio.start_unix_server(self.serve_stream, path=path)
+        async with server:
+            await server.serve_forever()
+
+    async def serve_stdin(self) -> None:
+        await self.serve_stream(_StdinReader(), _StdoutWriter())
+
+    def close(self) -> None:
+        self.executor.shutdown()
+
+
+async def serve(setting_file: str = None, socket_path: str = None, workers: int = None) -> None:
+    """
+    Serve on the Unix socket `socket_path`, or on stdin and stdout if it is None.
+    """
+    service = Service(setting_file, workers)
+    try:
+        await service.warm_up()
+        if socket_path is None:
+            await service.serve_stdin()
+        else:
+            await service.serve_unix(socket_path)
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--settings", default=main.SETTING_FILE)
+    parser.add_argument("--socket", default=None, help="Listen on this Unix socket instead of stdin")
+    parser.add_argument("-j", "--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.settings, args.socket, args.workers))
+    except KeyboardInterrupt:
+        pass
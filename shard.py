@@ -0,0 +1,126 @@
+"""
+Schedule the independent parts of a school in parallel.
+
+Two classes conflict if they share a teacher of a course which is scheduled (the normal and
+elective courses, the special courses are decided in advance). The connected components of
+this class-teacher graph can be scheduled separately, each in its own process, and the
+results are merged into one ALL_CLASSES.
+
+Usage:
+    python shard.py --settings settings.yaml --seed 0 -j 8 --output CourseScheduleOutput.csv
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import export
+import main
+import modules
+
+
+def class_components(all_classes: dict[str, modules.Class]) -> list[list[str]]:
+    """
+    Split the classes into the connected components of the class-teacher conflict graph.
+    :return: The class numbers of each component, the largest component first
+    """
+    parent = {class_num: class_num for class_num in all_classes}
+
+    def find(class_num: str) -> str:
+        while parent[class_num] != class_num:
+            parent[class_num] = parent[parent[class_num]]
+            class_num = parent[class_num]
+        return class_num
+
+    teacher_class: dict[modules.Teacher, str] = {}
+    for class_num, class_obj in all_classes.items():
+        for course_name, teacher in class_obj.teachers.items():
+            course = main.ALL_COURSES.get(course_name)
+            if teacher is None or course is None or course.mode == 5:
+                continue
+            other = teacher_class.setdefault(teacher, class_num)
+            parent[find(other)] = find(class_num)
+
+    components: dict[str, list[str]] = {}
+    for class_num in all_classes:
+        components.setdefault(find(class_num), []).append(class_num)
+    return sorted(components.values(), key=len, reverse=True)
+
+
+def run_component(
+    class_nums: list[str],
+    seed: np.random.SeedSequence,
+    setting_file: str = None,
+    engine: str = "random",
+    schedule_kwargs: dict = None,
+) -> dict[str, list[tuple[int, int, str]]]:
+    """
+    Schedule the classes of one component. Run in a worker process.
+    :return: The timetable of the component, see `main.timetable_of()`
+    """
+    main.load(setting_file)
+    main.schedule_loaded(engine, class_nums=set(class_nums), seed=seed, **(schedule_kwargs or {}))
+    return main.timetable_of({class_num: main.ALL_CLASSES[class_num] for class_num in class_nums})
+
+
+def run_sharded(
+    setting_file: str = None,
+    engine: str = "random",
+    seed: int = None,
+    workers: int = None,
+    **schedule_kwargs,
+) -> dict[str, modules.Class]:
+    """
+    Schedule each component of the classes in its own process and merge the results.
+    Each component gets an independent child stream of `seed`, so the result differs
+    from `main.run_schedule()` with the same seed.
+    :param workers: The number of processes, default to all cores. With one worker or
+        one component everything runs in this process.
+    :param schedule_kwargs: Passed to the engine, such as selection
+    :return: ALL_CLASSES holding the merged timetable
+    :raise ScheduleError: If a component fails
+    """
+    main.load(setting_file)
+    components = class_components(main.ALL_CLASSES)
+    seeds = np.random.SeedSequence(seed).spawn(len(components))
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(components))
+
+    arguments = (
+        components,
+        seeds,
+        [setting_file] * len(components),
+        [engine] * len(components),
+        [schedule_kwargs] * len(components),
+    )
+    if workers <= 1:
+        timetables = list(map(run_component, *arguments))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            timetables = list(executor.map(run_component, *arguments))
+
+    timetable = {}
+    for component_timetable in timetables:
+        timetable.update(component_timetable)
+    main.load(setting_file)
+    return main.apply_timetable(timetable)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--settings", default=main.SETTING_FILE)
+    parser.add_argument("--output", default="CourseScheduleOutput.csv")
+    parser.add_argument("--encoding", choices=export.ENCODINGS, default="gbk")
+    parser.add_argument("--engine", choices=sorted(main.ENGINES), default="random")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("-j", "--workers", type=int, default=None)
+    parser.add_argument("--selection", choices=["masked", "rejection"], default="masked")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    all_classes = run_sharded(args.settings, args.engine, args.seed, args.workers, selection=args.selection)
+    print(f"{len(class_components(all_classes))} components, {time.perf_counter() - start:.3f} s")
+    export.export_data(all_classes.items(), args.output, args.encoding)
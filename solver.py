@@ -0,0 +1,472 @@
+"""
+Deterministic backtracking solver, an alternative engine to the random `Schedule`.
+
+Each free (class, course time) is a variable whose domain is the set of normal courses
+(mode=0~3) that can be put there. The search is a depth first search with:
+- most constrained variable first (the smallest domain),
+- forward checking of teacher busy, daily max courses and course hours,
+- a capacity check: the course times of a class which can still take each course,
+  capped by its remaining hours and its daily max courses over the week, must cover
+  the unassigned course times of the class,
+- conflict-directed backjumping (FC-CBJ).
+"""
+import heapq
+import time as time_
+
+from data_processing import Schedule
+from modules import (
+    Class,
+    Course,
+    CourseTime,
+    InfeasibleSlotError,
+    ScheduleError,
+    Teacher,
+    COURSE_TIMES,
+    WEEKDAYS,
+)
+from probability import PROBABILITY_MODES
+
+
+def _bits(mask: int):
+    """
+    Yield the index of each set bit of `mask`.
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class BacktrackingSolver(Schedule):
+    """
+    Schedule courses by a deterministic search instead of random draws.
+    It reads and writes the same Course / Teacher / Class models as `Schedule`, so
+    `advance_schedule()` and `__call__()` are used in the same way.
+    """
+
+    deterministic = True
+
+    def _order_elective_times(
+        self, course_obj: Course, classes: list[Class], times: list[CourseTime]
+    ) -> list[CourseTime]:
+        """
+        Try the days which have the fewest of this course first, to spread it across days.
+        """
+        day_counts = {
+            day: max(each_class.daily_courses_num(day, course_obj) for each_class in classes)
+            for day in {course_time.day for course_time in times}
+        }
+        return sorted(times, key=lambda t: (day_counts[t.day], t.id))
+
+    def schedule_normal_courses(self, target_classes: list[Class], courses_: list) -> None:
+        """
+        Fill every free course time of the target classes with the normal courses.
+        With a time budget it stops when the budget runs out and keeps the courses placed.
+        :raise ScheduleError: If it is proved that there is no timetable (without a time budget).
+        """
+        phase_start = time_.perf_counter()
+        _Search(self, target_classes, courses_).solve()
+        if self.stats is not None:
+            self.stats.add_phase_time("normal", time_.perf_counter() - phase_start)
+
+
+class _Search(object):
+    """
+    The state of one FC-CBJ search. The levels are the order of assignment.
+    """
+
+    def __init__(
+        self, solver: BacktrackingSolver, target_classes: list[Class], courses_: list,
+        count_decided: bool = False,
+    ):
+        """
+        :param courses_: The normal courses of a class, each repeated by its hours
+        :param count_decided: Subtract the normal courses already decided in each class
+            from its hours, used when only a part of a timetable is solved again
+        """
+        self.solver = solver
+        self.stats = solver.stats
+        self.classes = target_classes
+        weights = solver.probability_table.weights
+
+        # Distinct normal courses and the hours of each
+        self.courses: list[Course] = []
+        self.hours: list[int] = []
+        course_index: dict[int, int] = {}
+        for course in courses_:
+            if course.mode not in PROBABILITY_MODES:
+                continue
+            if course.id not in course_index:
+                course_index[course.id] = len(self.courses)
+                self.courses.append(course)
+                self.hours.append(0)
+            self.hours[course_index[course.id]] += 1
+
+        # Remaining hours of each (class, course)
+        self.remaining: list[list[int]] = [list(self.hours) for _ in self.classes]
+        if count_decided:
+            for class_index, class_obj in enumerate(self.classes):
+                for course in class_obj.decided_courses.values():
+                    k = course_index.get(course.id)
+                    if k is not None:
+                        self.remaining[class_index][k] -= 1
+
+        # teacher of each (class, course), and the courses each teacher teaches in each class
+        self.teachers: list[list[Teacher | None]] = []
+        # Keyed by `Teacher.id`
+        self.teacher_courses: dict[int, list[tuple[int, int]]] = {}
+        for class_index, class_obj in enumerate(self.classes):
+            class_teachers = [class_obj.teachers.get(course.name) for course in self.courses]
+            self.teachers.append(class_teachers)
+            for k, teacher in enumerate(class_teachers):
+                if teacher is not None:
+                    self.teacher_courses.setdefault(teacher.id, {}).setdefault(class_index, 0)
+                    self.teacher_courses[teacher.id][class_index] |= 1 << k
+        self.teacher_courses = {
+            teacher_id: list(class_masks.items())
+            for teacher_id, class_masks in self.teacher_courses.items()
+        }
+
+        # Variables: free course times of each class, course time major, and their
+        # initial domains.
+        self.var_class: list[int] = []
+        self.var_time: list[CourseTime] = []
+        self.var_of: dict[tuple[int, int], int] = {}
+        self.base: list[int] = []
+        for course_time in COURSE_TIMES:
+            if solver._expired():
+                break
+            for class_index, class_obj in enumerate(self.classes):
+                if class_obj.cheek_decided_courses(course_time):
+                    continue
+                domain = self._initial_domain(class_index, course_time, weights)
+                if not domain:
+                    # With a time budget the course time is left unfilled.
+                    solver._give_up(InfeasibleSlotError(class_obj.class_num, course_time))
+                    continue
+                self.var_of[(class_index, course_time.id)] = len(self.var_class)
+                self.var_class.append(class_index)
+                self.var_time.append(course_time)
+                self.base.append(domain)
+        self.day_vars: dict[tuple[int, int], list[int]] = {}
+        self.class_vars: list[list[int]] = [[] for _ in self.classes]
+        for v, class_index in enumerate(self.var_class):
+            self.day_vars.setdefault((class_index, self.var_time[v].day), []).append(v)
+            self.class_vars[class_index].append(v)
+
+        self.current: list[int] = list(self.base)
+        # pruned[v]: [(level, removed mask, culprit levels)]
+        self.pruned: list[list[tuple[int, int, frozenset]]] = [[] for _ in self.base]
+        self.weights = weights
+
+        n = len(self.base)
+        self.level_var: list[int] = [-1] * n
+        self.level_value: list[int] = [-1] * n
+        self.var_level: list[int] = [-1] * n
+        self.conf: list[set] = [set() for _ in range(n)]
+        self.reductions: list[list[tuple[int, int]]] = [[] for _ in range(n)]
+
+        # The levels which used the hours of each (class, course)
+        self.hour_levels: dict[tuple[int, int], list[int]] = {}
+        self.day_levels: dict[tuple[int, int, int], list[int]] = {}
+
+        self.heap: list[tuple[int, int]] = [(domain.bit_count(), v) for v, domain in enumerate(self.base)]
+        heapq.heapify(self.heap)
+
+        # limit[class][k]: the most of course k the class can have by the daily max courses
+        # minus its remaining hours. Plus the remaining hours during the search, it is the
+        # most of course k the class can still have.
+        days = len(WEEKDAYS)
+        self.limit: list[list[int]] = []
+        for class_index, class_obj in enumerate(self.classes):
+            self.limit.append([
+                (course.daily_max_courses + 1) * days
+                - sum(class_obj.daily_courses_num(day, course) for day in WEEKDAYS)
+                - self.remaining[class_index][k]
+                for k, course in enumerate(self.courses)
+            ])
+        # support[class][k]: the unassigned variables of the class with k in their current domain
+        self.support: list[list[int]] = [[0] * len(self.courses) for _ in self.classes]
+        self.unassigned: list[int] = [len(class_vars) for class_vars in self.class_vars]
+        for v, domain in enumerate(self.base):
+            self._count(v, domain, 1)
+
+        # A class whose hours can not cover its free course times, before any search
+        self.short_class: Class | None = None
+        for class_index, class_obj in enumerate(self.classes):
+            if self._capacity(class_index) < 0:
+                self.short_class = class_obj
+                break
+
+    def _count(self, v: int, mask: int, delta: int) -> None:
+        support = self.support[self.var_class[v]]
+        for k in _bits(mask):
+            support[k] += delta
+
+    def _capacity(self, class_index: int) -> int:
+        """
+        The unassigned course times of the class which can be filled at most (each course
+        by its remaining hours, the course times it is still possible at and its daily max
+        courses), minus the number of them. Negative if they can not all be filled.
+        """
+        remaining = self.remaining[class_index]
+        return sum(map(
+            lambda hours, support, limit: min(hours, support, limit + hours),
+            remaining, self.support[class_index], self.limit[class_index],
+        )) - self.unassigned[class_index]
+
+    def _initial_domain(self, class_index: int, course_time: CourseTime, weights) -> int:
+        """
+        The courses which can be put at `course_time` of the class before the search.
+        """
+        class_obj = self.classes[class_index]
+        available = class_obj.store.class_available[class_obj.id]
+        domain = 0
+        for k, course in enumerate(self.courses):
+            teacher = self.teachers[class_index][k]
+            if teacher is None or self.remaining[class_index][k] <= 0:
+                continue
+            if weights[course_time.course_time - 1, course.mode] <= 0:
+                continue
+            if not available[course.id] & course_time.bit:
+                continue
+            if teacher.cheek_busy_courses(course_time):
+                continue
+            if class_obj.daily_courses_full(course_time.day, course):
+                continue
+            domain |= 1 << k
+        return domain
+
+    # --- variable ordering ---
+
+    def _push(self, v: int) -> None:
+        heapq.heappush(self.heap, (self.current[v].bit_count(), v))
+
+    def _select(self) -> int:
+        """
+        Pop the unassigned variable with the smallest domain.
+        """
+        while True:
+            size, v = heapq.heappop(self.heap)
+            if self.var_level[v] == -1 and self.current[v].bit_count() == size:
+                return v
+
+    def _value_order(self, v: int) -> list[int]:
+        """
+        Preferred courses first, by the probability at this course time times the
+        remaining hours, as the random Schedule draws from its course pool.
+        """
+        class_index = self.var_class[v]
+        row = self.weights[self.var_time[v].course_time - 1]
+        remaining = self.remaining[class_index]
+        return sorted(
+            _bits(self.current[v]),
+            key=lambda k: (-row[self.courses[k].mode] * remaining[k], k),
+        )
+
+    # --- assignment ---
+
+    def _place(self, level: int, v: int, k: int) -> None:
+        class_index = self.var_class[v]
+        course_time = self.var_time[v]
+        course = self.courses[k]
+        self.classes[class_index].add_decided_course([(course_time, course)])
+        self.teachers[class_index][k].add_busy_course(course, course_time)
+        self.remaining[class_index][k] -= 1
+        self.hour_levels.setdefault((class_index, k), []).append(level)
+        self.day_levels.setdefault((class_index, course_time.day, k), []).append(level)
+        self.level_value[level] = k
+
+    def _unplace(self, level: int) -> None:
+        v = self.level_var[level]
+        k = self.level_value[level]
+        class_index = self.var_class[v]
+        course_time = self.var_time[v]
+        self.classes[class_index].remove_decided_course(course_time)
+        self.teachers[class_index][k].remove_busy_course(course_time)
+        self.remaining[class_index][k] += 1
+        self.hour_levels[(class_index, k)].pop()
+        self.day_levels[(class_index, course_time.day, k)].pop()
+        self.level_value[level] = -1
+
+    def _prune(self, level: int, v: int, mask: int, culprits: frozenset) -> bool:
+        """
+        Remove `mask` from the domain of the future variable `v`.
+        :return: False if the domain is wiped out
+        """
+        mask &= self.current[v]
+        if not mask:
+            return True
+        self.current[v] ^= mask
+        self._count(v, mask, -1)
+        self.reductions[level].append((v, mask))
+        self.pruned[v].append((level, mask, culprits))
+        if self.current[v]:
+            self._push(v)
+            return True
+        # Domain wipe out, its pruners are the conflict of this level.
+        self.conf[level] |= self._past_fc(v) - {level}
+        return False
+
+    def _past_fc(self, v: int) -> set:
+        culprits = set()
+        for _, _, levels in self.pruned[v]:
+            culprits |= levels
+        return culprits
+
+    def _check_capacity(self, level: int, class_index: int) -> bool:
+        """
+        :return: False if the hours of the class can not cover its unassigned course
+            times, the placements and prunings of the class are the conflict then
+        """
+        if self._capacity(class_index) >= 0:
+            return True
+        culprits = set()
+        for k in range(len(self.courses)):
+            culprits.update(self.hour_levels.get((class_index, k), ()))
+        for other in self.class_vars[class_index]:
+            if self.var_level[other] == -1:
+                culprits |= self._past_fc(other)
+        self.conf[level] |= culprits - {level}
+        return False
+
+    def _check_forward(self, level: int, v: int, k: int) -> bool:
+        class_index = self.var_class[v]
+        course_time = self.var_time[v]
+        course = self.courses[k]
+        this_level = frozenset((level,))
+
+        # The teacher is busy at this course time for the other classes.
+        teacher = self.teachers[class_index][k]
+        for other_class, mask in self.teacher_courses[teacher.id]:
+            other = self.var_of.get((other_class, course_time.id))
+            if other is None or other == v or self.var_level[other] != -1:
+                continue
+            if not self._prune(level, other, mask, this_level):
+                return False
+            if not self._check_capacity(level, other_class):
+                return False
+
+        # Daily max courses
+        class_obj = self.classes[class_index]
+        if class_obj.daily_courses_full(course_time.day, course):
+            culprits = frozenset(self.day_levels[(class_index, course_time.day, k)])
+            for other in self.day_vars[(class_index, course_time.day)]:
+                if self.var_level[other] == -1 and not self._prune(level, other, 1 << k, culprits):
+                    return False
+
+        # Course hours
+        if self.remaining[class_index][k] == 0:
+            culprits = frozenset(self.hour_levels[(class_index, k)])
+            for other in self.class_vars[class_index]:
+                if self.var_level[other] == -1 and not self._prune(level, other, 1 << k, culprits):
+                    return False
+        return self._check_capacity(level, class_index)
+
+    def _undo_reductions(self, level: int) -> None:
+        for v, mask in reversed(self.reductions[level]):
+            self.current[v] |= mask
+            self.pruned[v].pop()
+            if self.var_level[v] == -1:
+                self._count(v, mask, 1)
+                self._push(v)
+        self.reductions[level] = []
+
+    def _update_current_domain(self, v: int) -> None:
+        """
+        Recompute the domain of the unassigned variable `v` from its prunings.
+        """
+        domain = self.base[v]
+        for _, mask, _ in self.pruned[v]:
+            domain &= ~mask
+        self._count(v, self.current[v] & ~domain, -1)
+        self._count(v, domain & ~self.current[v], 1)
+        self.current[v] = domain
+
+    def _label(self, level: int) -> bool:
+        """
+        Try the values of the variable of `level` until one passes the forward check.
+        """
+        v = self.level_var[level]
+        for k in self._value_order(v):
+            self._place(level, v, k)
+            if self._check_forward(level, v, k):
+                return True
+            self._undo_reductions(level)
+            self._unplace(level)
+            self.current[v] &= ~(1 << k)
+        return False
+
+    def _unlabel(self, level: int) -> int:
+        """
+        Jump back from a dead end at `level`.
+        :return: The level to continue from, -1 if there is no timetable
+        """
+        v = self.level_var[level]
+        culprits = self.conf[level] | self._past_fc(v)
+        if not culprits:
+            return -1
+        h = max(culprits)
+        self.conf[h] |= culprits - {h}
+        if self.stats is not None:
+            self.stats.add_backtrack()
+
+        freed = []
+        for j in range(level, h, -1):
+            var_j = self.level_var[j]
+            if self.level_value[j] != -1:
+                self._undo_reductions(j)
+                self._unplace(j)
+            self.conf[j] = set()
+            self.level_var[j] = -1
+            self.var_level[var_j] = -1
+            self._count(var_j, self.current[var_j], 1)
+            self.unassigned[self.var_class[var_j]] += 1
+            freed.append(var_j)
+        for var_j in freed:
+            self._update_current_domain(var_j)
+            self._push(var_j)
+
+        var_h = self.level_var[h]
+        k = self.level_value[h]
+        self._undo_reductions(h)
+        self._unplace(h)
+        self.current[var_h] &= ~(1 << k)
+        return h
+
+    def _assign_level(self, level: int) -> None:
+        v = self._select()
+        self.level_var[level] = v
+        self.var_level[v] = level
+        self._count(v, self.current[v], -1)
+        self.unassigned[self.var_class[v]] -= 1
+        self.conf[level] = set()
+
+    def solve(self) -> None:
+        n = len(self.base)
+        if n == 0:
+            return
+        if self.short_class is not None:
+            self.solver._give_up(ScheduleError(
+                f"The course hours and daily max courses of class {self.short_class.class_num} "
+                "can not fill its free course times!"
+            ))
+            return
+        level = 0
+        self._assign_level(level)
+        steps = 0
+        while True:
+            steps += 1
+            if steps % 256 == 0 and self.solver._expired():
+                # Keep the courses placed so far.
+                return
+            if self._label(level):
+                level += 1
+                if level == n:
+                    return
+                self._assign_level(level)
+            else:
+                level = self._unlabel(level)
+                if level < 0:
+                    self.solver._give_up(ScheduleError("There is no timetable which satisfies the settings!"))
+                    return